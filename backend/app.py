@@ -1,23 +1,27 @@
 from dotenv import load_dotenv
 load_dotenv()
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Blueprint, Response, current_app, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-import fitz  # PyMuPDF
-from groq import Groq
 import os
 import json
+import time
 import logging
-from pymongo import MongoClient
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-import bcrypt
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt, get_jwt_identity
 from bson import ObjectId
 from bson.errors import InvalidId
-import random
 import csv
 import io
 from pytz import timezone
-from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime
+from datetime import datetime, timedelta
+from database import LazyCollection, ping
+from llm_scheduler import FairScheduler, QueueFull, QuotaExceeded, INTERACTIVE, BULK, DAILY_TOKEN_BUDGET
+from prompts import build_mcq_messages, best_matching_chunk, new_ledger, add_usage, ledger_increment
+from chunk_scorer import ChunkSampler, document_key
+from pdf_extract import extract_text
+from json_provider import FastJSONProvider
+from storage import StreamingRequest, UploadRejected, init_blob_store, MAX_UPLOAD_BYTES
+from live_feed import LiveFeedHub, cooperative_workers
+from variants import shuffled_mcqs, canonical_answers, student_answers, score_answers
 
 # Logging setup
 logging.basicConfig(
@@ -26,83 +30,94 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
-app = Flask(__name__)
-CORS(app, 
-     resources={r"/*": {
-         "origins": ["http://localhost:8080","https://frontend-fp3y.onrender.com"],
-         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-         "allow_headers": ["Content-Type", "Authorization"],
-         "expose_headers": ["Content-Type", "Authorization"],
-         "supports_credentials": True,
-         "max_age": 3600
-     }},
-     supports_credentials=True)
-
-@app.after_request
+ALLOWED_ORIGINS = ["http://localhost:8080","https://frontend-fp3y.onrender.com"]
+
+# MongoDB collections, connected lazily on first use in each process
+users_collection = LazyCollection('users')
+tests_collection = LazyCollection('tests')
+chunk_stats_collection = LazyCollection('chunk_stats')
+blobs_collection = LazyCollection('blobs')
+llm_usage_collection = LazyCollection('llm_usage')
+blob_store = init_blob_store(blobs_collection)
+
+# LLM scheduling: fair share across users, interactive work ahead of bulk generation.
+# Queuing is per process, so it only applies where a process serves requests concurrently.
+llm_scheduler = FairScheduler(usage_collection=llm_usage_collection, queueing=cooperative_workers())
+
+# Live proctoring: one watcher per test, fanned out to every connected teacher
+live_feed_hub = LiveFeedHub(tests_collection)
+
+# Lifetime of the scoped token an EventSource passes in the live feed URL
+LIVE_FEED_TOKEN_SECONDS = 60
+
+# IST Timezone
+IST = timezone('Asia/Kolkata')
+
+api = Blueprint('api', __name__)
+
+def create_app():
+    """Application factory. Cheap and side-effect free: no connections, threads or heavy imports."""
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.request_class = StreamingRequest
+    # Reject oversized uploads from Content-Length before reading the body (1 MB multipart overhead)
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
+    CORS(app, 
+         resources={r"/*": {
+             "origins": ALLOWED_ORIGINS,
+             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+             "allow_headers": ["Content-Type", "Authorization"],
+             "expose_headers": ["Content-Type", "Authorization"],
+             "supports_credentials": True,
+             "max_age": 3600
+         }},
+         supports_credentials=True)
+
+    # JWT setup
+    app.config['JWT_SECRET_KEY'] = os.getenv("JWT_SECRET_KEY")
+    if not app.config['JWT_SECRET_KEY']:
+        raise ValueError("JWT_SECRET_KEY is not set in the environment")
+    jwt = JWTManager(app)
+
+    @jwt.token_verification_loader
+    def verify_token_scope(jwt_header, jwt_data):
+        # Scoped tokens travel in URLs (and so in logs); they only open the live feed
+        return jwt_data.get('scope') is None or request.endpoint == 'api.live_feed'
+
+    app.register_blueprint(api)
+    return app
+
+@api.after_app_request
 def after_request(response):
     origin = request.headers.get('Origin')
-    if origin in ["http://localhost:8080","https://frontend-fp3y.onrender.com"]:
+    if origin in ALLOWED_ORIGINS:
         response.headers.add('Access-Control-Allow-Origin', origin)
         response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
         response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
         response.headers.add('Access-Control-Allow-Credentials', 'true')
     return response
 
-# MongoDB setup
-MONGO_DB_URI = os.getenv("MONGO_DB_URI")
-if not MONGO_DB_URI:
-    raise ValueError("MONGO_DB_URI is not set in the environment")
-client = MongoClient(MONGO_DB_URI)
-db = client['mcq_generator']
-users_collection = db['users']
-tests_collection = db['tests']
-
-# JWT setup
-app.config['JWT_SECRET_KEY'] = os.getenv("JWT_SECRET_KEY")
-if not app.config['JWT_SECRET_KEY']:
-    raise ValueError("JWT_SECRET_KEY is not set in the environment")
-jwt = JWTManager(app)
-
-# IST Timezone
-IST = timezone('Asia/Kolkata')
-
-# Scheduler setup for automatic test status updates
-scheduler = BackgroundScheduler()
-scheduler.start()
-
-def update_test_status():
-    """Background task to update test statuses based on IST time."""
-    now = datetime.now(IST).isoformat()
-    tests = tests_collection.find({"status": {"$in": ["assigned", "active"]}})
-    for test in tests:
-        start_time = test.get("start_time")
-        end_time = test.get("end_time")
-        if not start_time or not end_time:
-            continue
-        if now >= start_time and now <= end_time and test["status"] != "active":
-            tests_collection.update_one(
-                {"_id": test["_id"]},
-                {"$set": {"status": "active"}}
-            )
-            logging.info(f"Test {test['test_name']} auto-set to active")
-        elif now > end_time and test["status"] != "stopped":
-            tests_collection.update_one(
-                {"_id": test["_id"]},
-                {"$set": {"status": "stopped"}}
-            )
-            logging.info(f"Test {test['test_name']} auto-set to stopped")
+# Health Endpoints
+@api.route('/healthz', methods=['GET'])
+def liveness():
+    return jsonify({'status': 'ok'}), 200
 
-# Schedule status updates every minute
-scheduler.add_job(update_test_status, 'interval', minutes=1)
+@api.route('/readyz', methods=['GET'])
+def readiness():
+    """Ready once MongoDB answers a ping; connects lazily on the first probe."""
+    started = time.monotonic()
+    try:
+        ping()
+    except Exception as e:
+        logging.warning(f"Readiness check failed: {str(e)}")
+        return jsonify({'ready': False, 'error': 'Database unavailable'}), 503
+    return jsonify({'ready': True, 'db_ping_ms': round((time.monotonic() - started) * 1000, 1)}), 200
 
 # Utility Functions
 def extract_text_from_pdf(pdf_path):
     """Extract text from a PDF file."""
-    text = ""
     try:
-        with fitz.open(pdf_path) as doc:
-            for page in doc:
-                text += page.get_text("text") + "\n"
+        text = extract_text(pdf_path)
         logging.info(f"Extracted {len(text)} characters from PDF: {pdf_path}")
         return text
     except Exception as e:
@@ -122,43 +137,45 @@ def extract_json_from_response(raw_output):
         raise ValueError("No JSON array delimiters found")
     return json.loads(raw_output[start_idx:end_idx])
 
-def generate_mcq_with_relevance(text, groq_api_key, num_questions=2, difficulty="medium", excluded_questions=None):
-    """Generate MCQs from text using Groq API, avoiding specified questions."""
+def hash_password(password):
+    import bcrypt  # deferred to keep startup fast
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+
+def check_password(password, hashed):
+    import bcrypt
+    return bcrypt.checkpw(password.encode('utf-8'), hashed)
+
+def llm_busy_response(error):
+    """429 response for requests turned away by the LLM scheduler."""
+    if isinstance(error, QueueFull):
+        response = jsonify({'error': 'MCQ generation is busy, please retry shortly', 'queue_position': error.position, 'retry_after': error.retry_after})
+        response.headers['Retry-After'] = str(int(error.retry_after) + 1)
+        return response, 429
+    return jsonify({'error': 'Daily question generation budget exhausted', 'used_tokens': error.used, 'token_budget': error.limit}), 429
+
+def generate_mcq_with_relevance(text, groq_api_key, num_questions=2, difficulty="medium", excluded_questions=None, user_id=None, role=None, priority=BULK, ledger=None, question_type="mixed"):
+    """Generate MCQs from text using Groq API, avoiding specified questions.
+
+    Token usage of the call is added to `ledger` when given.
+    """
+    # Deferred: groq/httpx are only needed by workers that generate questions
+    from llm_client import get_llm_client, LLMUnavailableError
     try:
-        client = Groq(api_key=groq_api_key)
-        difficulty_instructions = {
-            "easy": "For easy difficulty, generate straightforward and concise questions that test basic recall or understanding of key terms or concepts. Use clear and distinct options with obviously incorrect distractors.",
-            "medium": "For medium difficulty, generate questions that require some analysis or application of concepts. Include plausible distractors that might reflect common mistakes.",
-            "hard": "For hard difficulty, generate complex questions that demand deep understanding, synthesis of multiple concepts, or complex problem-solving. Use very plausible distractors that require careful consideration."
-        }
-        instruction = difficulty_instructions.get(difficulty, "")
-        # Build exclusion instruction if provided
-        exclusion_prompt = ""
-        if excluded_questions:
-            exclusion_prompt = f"Do not generate questions identical or very similar to the following: {json.dumps(excluded_questions)}.\n"
-        prompt = (
-            f"Generate {num_questions} multiple-choice questions from the text below. "
-            f"{instruction} "
-            f"Questions must be relevant to the subject and usable in an examination. "
-            f"Choose the type ('theory' or 'numerical') based on the content: use 'numerical' for questions involving calculations or mathematical concepts, and 'theory' otherwise. "
-            f"Set the 'difficulty' field to '{difficulty}' for each question. "
-            f"Each question should be a JSON object with: question (string), options (array of 4 strings), "
-            f"correct_answer (string), type (theory/numerical), difficulty (string), "
-            f"relevance_score (float between 0 and 1, where 1 is highly relevant). "
-            f"{exclusion_prompt}"
-            f"Return a JSON array only.\n\nText:\n{text}"
-        )
-        completion = client.chat.completions.create(
-            model="meta-llama/llama-4-scout-17b-16e-instruct",
-            messages=[
-                {"role": "system", "content": "You are an AI expert in question generation."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_completion_tokens=1024,
-            top_p=1,
-            stream=False,
-        )
+        client = get_llm_client(groq_api_key)
+        messages = build_mcq_messages(text, num_questions, difficulty, excluded_questions, question_type=question_type)
+        tokens = client.call_cost(messages, 1024)
+        with llm_scheduler.slot(user_id, role, priority, client=client, tokens=tokens):
+            completion = client.chat(
+                messages=messages,
+                token_reserved=True,
+                temperature=0.7,
+                max_completion_tokens=1024,
+                top_p=1,
+                stream=False,
+            )
+        if completion.usage:
+            add_usage(ledger, completion.usage)
+            llm_scheduler.record_usage(user_id, role, completion.usage)
         raw_output = completion.choices[0].message.content if completion.choices else None
         if not raw_output:
             return {"error": "No valid response from AI model"}
@@ -166,25 +183,33 @@ def generate_mcq_with_relevance(text, groq_api_key, num_questions=2, difficulty=
         mcq_output = extract_json_from_response(raw_output)
         if not isinstance(mcq_output, list):
             return {"error": "Response is not a JSON array"}
-        required_fields = {"question", "options", "correct_answer", "type", "difficulty", "relevance_score"}
+        required_fields = {"question", "options", "correct_answer", "type", "relevance_score"}
         for mcq in mcq_output:
             if not all(field in mcq for field in required_fields) or len(mcq["options"]) != 4:
                 return {"error": "Invalid MCQ format"}
             if not (0 <= mcq["relevance_score"] <= 1):
                 return {"error": "Relevance score must be between 0 and 1"}
+            # The requested level, not the model's opinion: the frontend and regeneration key off it
+            mcq["difficulty"] = difficulty
         return mcq_output
+    except LLMUnavailableError as e:
+        logging.error(f"MCQ generation failed, provider unavailable: {str(e)}")
+        return {"error": str(e), "retryable": True}
     except Exception as e:
         logging.error(f"MCQ generation failed: {str(e)}")
         return {"error": str(e)}
 
-def generate_mcqs_from_random_chunks(text, groq_api_key, difficulty_distribution, min_relevance=0.7):
-    """Generate MCQs by sampling random chunks for each difficulty level."""
+def generate_mcqs_from_random_chunks(text, groq_api_key, difficulty_distribution, min_relevance=0.7, question_type="mixed", user_id=None, role=None, ledger=None):
+    """Generate MCQs by sampling chunks for each difficulty level, biased towards high-yield chunks."""
     chunks = split_text_into_chunks(text)
     if not chunks:
         return {"error": "No text chunks available"}
+    sampler = ChunkSampler(chunks, document_key(text), chunk_stats_collection, question_type)
     
     all_mcqs = []
     max_attempts_per_difficulty = 50  # Limit to avoid excessive API calls
+    max_provider_failures = 3  # Rate limits/outages don't burn chunks, but don't spin forever
+    provider_failures = 0
 
     for difficulty, count in difficulty_distribution.items():
         if count == 0:
@@ -194,23 +219,34 @@ def generate_mcqs_from_random_chunks(text, groq_api_key, difficulty_distribution
         attempted_chunks = set()
 
         while collected < count and attempts < max_attempts_per_difficulty and len(attempted_chunks) < len(chunks):
-            remaining_chunks = [i for i in range(len(chunks)) if i not in attempted_chunks]
-            if not remaining_chunks:
+            chunk_idx = sampler.choose(attempted_chunks)
+            if chunk_idx is None:
                 break
-            chunk_idx = random.choice(remaining_chunks)
             attempted_chunks.add(chunk_idx)
             chunk_text = chunks[chunk_idx]
 
             # Generate up to 2 MCQs per chunk, but only request what's needed
             chunk_size = min(2, count - collected)
-            mcqs = generate_mcq_with_relevance(chunk_text, groq_api_key, chunk_size, difficulty)
+            mcqs = generate_mcq_with_relevance(chunk_text, groq_api_key, chunk_size, difficulty, user_id=user_id, role=role, ledger=ledger, question_type=question_type)
+            if isinstance(mcqs, dict) and mcqs.get('retryable'):
+                provider_failures += 1
+                if provider_failures >= max_provider_failures:
+                    if all_mcqs:
+                        logging.error(f"LLM provider unavailable, returning {len(all_mcqs)} MCQs collected so far")
+                        return all_mcqs
+                    return {"error": mcqs['error']}
+                attempted_chunks.discard(chunk_idx)
+                continue
+            provider_failures = 0
             if isinstance(mcqs, dict) and 'error' in mcqs:
                 logging.warning(f"Skipping chunk {chunk_idx} for {difficulty} due to error: {mcqs['error']}")
+                sampler.record(chunk_idx, chunk_size, 0)
                 attempts += 1
                 continue
             
             # Filter relevant MCQs and limit to what's needed
             relevant_mcqs = [mcq for mcq in mcqs if mcq["relevance_score"] >= min_relevance]
+            sampler.record(chunk_idx, chunk_size, min(len(relevant_mcqs), chunk_size))
             # Only take enough MCQs to reach the target count
             needed = count - collected
             selected_mcqs = relevant_mcqs[:needed]
@@ -227,7 +263,7 @@ def generate_mcqs_from_random_chunks(text, groq_api_key, difficulty_distribution
     return all_mcqs
 
 # Authentication Endpoints
-@app.route('/api/signup', methods=['POST', 'OPTIONS'])
+@api.route('/api/signup', methods=['POST', 'OPTIONS'])
 def signup():
     if request.method == 'OPTIONS':
         return '', 204
@@ -255,7 +291,7 @@ def signup():
         if users_collection.find_one({"email": email}):
             return jsonify({"error": "Email already registered"}), 409
 
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        hashed_password = hash_password(password)
         user = {
             "name": name,
             "email": email,
@@ -284,7 +320,7 @@ def signup():
         logging.error(f"Signup error: {str(e)}")
         return jsonify({"error": "An unexpected error occurred"}), 500
 
-@app.route('/api/login', methods=['POST', 'OPTIONS'])
+@api.route('/api/login', methods=['POST', 'OPTIONS'])
 def login():
     if request.method == 'OPTIONS':
         return '', 204
@@ -293,7 +329,7 @@ def login():
     if not email or not password:
         return jsonify({"error": "Email and password required"}), 400
     user = users_collection.find_one({"email": email})
-    if not user or not bcrypt.checkpw(password.encode('utf-8'), user['password']):
+    if not user or not check_password(password, user['password']):
         return jsonify({"error": "Invalid credentials"}), 401
     access_token = create_access_token(identity=str(user['_id']))
     return jsonify({
@@ -301,7 +337,7 @@ def login():
         "token": access_token
     }), 200
 
-@app.route('/api/check-auth', methods=['GET', 'OPTIONS'])
+@api.route('/api/check-auth', methods=['GET', 'OPTIONS'])
 @jwt_required()
 def check_auth():
     if request.method == 'OPTIONS':
@@ -315,19 +351,20 @@ def check_auth():
         "user": {"id": str(user["_id"]), "name": user["name"], "email": user["email"], "role": user["role"]}
     }), 200
 
-@app.route('/api/cleanup-pdf', methods=['POST'])
+@api.route('/api/cleanup-pdf', methods=['POST'])
 @jwt_required()
 def cleanup_pdf():
     user_id = get_jwt_identity()
     data = request.get_json()
     pdf_path = data.get('pdf_path')
-    if pdf_path and os.path.exists(pdf_path):
-        os.remove(pdf_path)
+    if blob_store.resolve(pdf_path):
+        # Drop this user's upload reference; the GC sweeper deletes the blob once unreferenced
+        blob_store.release(pdf_path, f"upload:{user_id}")
         logging.info(f"Cleaned up PDF: {pdf_path} for user: {user_id}")
     return jsonify({'success': True}), 200
 
 # Profile Management
-@app.route('/api/update-profile', methods=['PUT', 'OPTIONS'])
+@api.route('/api/update-profile', methods=['PUT', 'OPTIONS'])
 @jwt_required()
 def update_profile():
     if request.method == 'OPTIONS':
@@ -339,7 +376,7 @@ def update_profile():
         return jsonify({'error': 'Name and email required'}), 400
     update_data = {"name": name, "email": email}
     if password:
-        update_data["password"] = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        update_data["password"] = hash_password(password)
     result = users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": update_data})
     if result.matched_count == 0:
         return jsonify({'error': 'User not found'}), 404
@@ -347,7 +384,7 @@ def update_profile():
     return jsonify({'message': 'Profile updated successfully'}), 200
 
 # MCQ Generation Endpoints
-@app.route('/api/upload-pdf', methods=['POST'])
+@api.route('/api/upload-pdf', methods=['POST'])
 @jwt_required()
 def upload_pdf():
     user_id = get_jwt_identity()
@@ -356,13 +393,16 @@ def upload_pdf():
     pdf_file = request.files['pdf']
     pdf_name = pdf_file.filename
     if not pdf_name.endswith('.pdf'):
+        pdf_file.stream.discard()
         return jsonify({'error': 'Invalid file format'}), 400
-    temp_path = f"temp_{user_id}_{pdf_name}"
-    pdf_file.save(temp_path)
-    logging.info(f"PDF uploaded: {temp_path}")
-    return jsonify({'success': True, 'pdf_path': temp_path, 'pdf_name': pdf_name}), 200
+    try:
+        blob_id, pages = blob_store.commit(pdf_file.stream, f"upload:{user_id}")
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), 400
+    logging.info(f"PDF uploaded: {pdf_name} as blob {blob_id[:12]} ({pages} pages)")
+    return jsonify({'success': True, 'pdf_path': blob_id, 'pdf_name': pdf_name}), 200
 
-@app.route('/api/generate-mcqs', methods=['POST'])
+@api.route('/api/generate-mcqs', methods=['POST'])
 @jwt_required()
 def generate_mcqs_endpoint():
     user_id = get_jwt_identity()
@@ -370,9 +410,14 @@ def generate_mcqs_endpoint():
     pdf_path = None
     try:
         pdf_path = request.form.get('pdf_path')
+        pdf_file_path = blob_store.resolve(pdf_path)
         pdf_name = request.form.get('pdf_name')
         test_name = request.form.get('test_name', f"Test_{datetime.now(IST).strftime('%Y%m%d_%H%M%S')}")
         difficulty = request.form.get('difficulty', default='{"easy": 0, "medium": 5, "hard": 0}')
+        # Optional hint: 'numerical' favours calculation-heavy chunks and questions
+        question_type = request.form.get('question_type', default='mixed')
+        if question_type not in ('mixed', 'theory', 'numerical'):
+            return jsonify({'error': 'question_type must be mixed, theory or numerical'}), 400
 
         # Parse difficulty as JSON object
         try:
@@ -396,7 +441,7 @@ def generate_mcqs_endpoint():
 
         logging.info(f"Request data: pdf_path={pdf_path}, pdf_name={pdf_name}, num_questions={num_questions}, difficulty={difficulty_distribution}, test_name={test_name}")
 
-        if not pdf_path or not os.path.exists(pdf_path):
+        if not pdf_file_path:
             return jsonify({'error': 'PDF path invalid or missing'}), 400
         if not pdf_name:
             return jsonify({'error': 'PDF name missing'}), 400
@@ -405,8 +450,16 @@ def generate_mcqs_endpoint():
         if not groq_api_key:
             raise ValueError("GROQ_API_KEY not set")
 
-        extracted_text = extract_text_from_pdf(pdf_path)
-        mcqs = generate_mcqs_from_random_chunks(extracted_text, groq_api_key, difficulty_distribution)
+        user = users_collection.find_one({"_id": ObjectId(user_id)})
+        is_student = user.get('role') == 'student'
+        try:
+            llm_scheduler.admit(user_id, user.get('role'), BULK)
+        except (QueueFull, QuotaExceeded) as e:
+            return llm_busy_response(e)
+
+        extracted_text = extract_text_from_pdf(pdf_file_path)
+        ledger = new_ledger()
+        mcqs = generate_mcqs_from_random_chunks(extracted_text, groq_api_key, difficulty_distribution, question_type=question_type, user_id=user_id, role=user.get('role'), ledger=ledger)
 
         if isinstance(mcqs, dict) and 'error' in mcqs:
             logging.error(f"MCQ generation error: {mcqs['error']}")
@@ -415,9 +468,6 @@ def generate_mcqs_endpoint():
         if len(mcqs) < num_questions:
             logging.warning(f"Generated only {len(mcqs)} MCQs instead of {num_questions} due to relevance filtering.")
 
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
-        is_student = user.get('role') == 'student'
-
         existing_test = tests_collection.find_one({
             "user_id": user_id,
             "test_name": test_name,
@@ -431,6 +481,7 @@ def generate_mcqs_endpoint():
             "user_id": user_id,
             "test_name": test_name,
             "pdf_name": pdf_name,
+            "pdf_hash": pdf_path,
             "mcqs": mcqs,
             "created_at": datetime.now(IST).isoformat(),
             "status": "active" if is_student else "generated",
@@ -438,7 +489,8 @@ def generate_mcqs_endpoint():
             "start_time": datetime.now(IST).isoformat() if is_student else None,
             "end_time": None,
             "duration": duration,
-            "result": {}
+            "result": {},
+            "token_usage": ledger
         }
 
         if existing_test:
@@ -446,12 +498,17 @@ def generate_mcqs_endpoint():
                 {"_id": existing_test["_id"]},
                 {"$set": {
                     "mcqs": mcqs,
+                    "pdf_hash": pdf_path,
                     "created_at": datetime.now(IST).isoformat(),
-                }}
+                }, "$inc": ledger_increment(ledger)}
             )
+            if existing_test.get("pdf_hash") != pdf_path:
+                blob_store.release(existing_test.get("pdf_hash"), f"test:{existing_test['_id']}")
+            blob_store.add_ref(pdf_path, f"test:{existing_test['_id']}")
             logging.info(f"Updated existing test {test_name} with {len(mcqs)} MCQs")
         else:
-            tests_collection.insert_one(test_data)
+            result = tests_collection.insert_one(test_data)
+            blob_store.add_ref(pdf_path, f"test:{result.inserted_id}")
             logging.info(f"Created new test {test_name} with {len(mcqs)} MCQs")
 
         return jsonify({
@@ -462,12 +519,12 @@ def generate_mcqs_endpoint():
             'warning': f"Only {len(mcqs)} questions generated due to relevance filtering" if len(mcqs) < num_questions else None
         }), 200
     except Exception as e:
-        if pdf_path and os.path.exists(pdf_path):
-            os.remove(pdf_path)
+        if blob_store.resolve(pdf_path):
+            blob_store.release(pdf_path, f"upload:{user_id}")
         logging.error(f"Error in /api/generate-mcqs: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/delete-test', methods=['DELETE'])
+@api.route('/api/delete-test', methods=['DELETE'])
 @jwt_required()
 def delete_test():
     user_id = get_jwt_identity()
@@ -488,6 +545,7 @@ def delete_test():
         result = tests_collection.delete_one({"user_id": user_id, "test_name": test_name})
         if result.deleted_count == 0:
             return jsonify({'error': 'Failed to delete test'}), 500
+        blob_store.release(test.get("pdf_hash"), f"test:{test['_id']}")
 
         logging.info(f"Test {test_name} deleted by user {user_id}")
         return jsonify({'success': True, 'message': 'Test deleted successfully'}), 200
@@ -496,7 +554,7 @@ def delete_test():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # Review and Edit MCQs
-@app.route('/api/review-mcqs', methods=['GET'])
+@api.route('/api/review-mcqs', methods=['GET'])
 @jwt_required()
 def review_mcqs():
     user_id = get_jwt_identity()
@@ -526,7 +584,7 @@ def review_mcqs():
         'pages': (total + limit - 1) // limit
     }), 200
 
-@app.route('/api/update-mcq', methods=['PUT'])
+@api.route('/api/update-mcq', methods=['PUT'])
 @jwt_required()
 def update_mcq():
     user_id = get_jwt_identity()
@@ -550,7 +608,7 @@ def update_mcq():
     logging.info(f"Updated MCQ at index {mcq_index} for test {test_name}")
     return jsonify({'message': 'MCQ updated successfully'}), 200
 
-@app.route('/api/delete-mcq', methods=['DELETE'])
+@api.route('/api/delete-mcq', methods=['DELETE'])
 @jwt_required()
 def delete_mcq():
     user_id = get_jwt_identity()
@@ -570,7 +628,7 @@ def delete_mcq():
     logging.info(f"Deleted MCQ at index {mcq_index} from test {test_name}")
     return jsonify({'message': 'MCQ deleted successfully'}), 200
 
-@app.route('/api/regenerate-mcq', methods=['POST'])
+@api.route('/api/regenerate-mcq', methods=['POST'])
 @jwt_required()
 def regenerate_mcq():
     user_id = get_jwt_identity()
@@ -587,16 +645,36 @@ def regenerate_mcq():
     if not groq_api_key:
         return jsonify({'error': 'GROQ_API_KEY not set'}), 500
 
-    extracted_text = extract_text_from_pdf(f"temp_{user_id}_{test['pdf_name']}")
+    user = users_collection.find_one({"_id": ObjectId(user_id)})
+    try:
+        llm_scheduler.admit(user_id, user.get('role'), INTERACTIVE)
+    except (QueueFull, QuotaExceeded) as e:
+        return llm_busy_response(e)
+
+    pdf_file_path = blob_store.resolve(test.get('pdf_hash')) or f"temp_{user_id}_{test['pdf_name']}"
+    if not os.path.exists(pdf_file_path):
+        return jsonify({'error': 'Source PDF no longer available'}), 404
+    extracted_text = extract_text_from_pdf(pdf_file_path)
     # Pass the current MCQ's question as excluded
     current_mcq = test['mcqs'][mcq_index]
+    # Regenerate from the chunk the question came from rather than sending the whole PDF
+    source_text = best_matching_chunk(split_text_into_chunks(extracted_text), current_mcq['question'])
+    ledger = new_ledger()
     new_mcq = generate_mcq_with_relevance(
-        extracted_text, 
+        source_text, 
         groq_api_key, 
         num_questions=1, 
         difficulty=current_mcq['difficulty'],
-        excluded_questions=[current_mcq['question']]
+        excluded_questions=[current_mcq['question']],
+        user_id=user_id,
+        role=user.get('role'),
+        priority=INTERACTIVE,
+        ledger=ledger,
+        # Replace a question with one of the same kind
+        question_type=current_mcq.get('type') if current_mcq.get('type') in ('theory', 'numerical') else 'mixed'
     )
+    # Tokens are spent whether or not the regeneration succeeded
+    tests_collection.update_one({"_id": test["_id"]}, {"$inc": ledger_increment(ledger)})
     if isinstance(new_mcq, dict) and 'error' in new_mcq:
         return jsonify({'error': new_mcq['error']}), 500
 
@@ -607,8 +685,27 @@ def regenerate_mcq():
     logging.info(f"Regenerated MCQ at index {mcq_index} for test {test_name}")
     return jsonify({'message': 'MCQ regenerated successfully', 'new_mcq': new_mcq[0]}), 200
 
+@api.route('/api/llm-usage', methods=['GET'])
+@jwt_required()
+def get_llm_usage():
+    user_id = get_jwt_identity()
+    user = users_collection.find_one({"_id": ObjectId(user_id)})
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    usage = llm_scheduler.usage(user_id)
+    response = {
+        'tokens_today': usage['tokens'],
+        'prompt_tokens_today': usage['prompt_tokens'],
+        'completion_tokens_today': usage['completion_tokens'],
+        'calls_today': usage['calls'],
+        'token_budget': DAILY_TOKEN_BUDGET.get(user['role'], 0)
+    }
+    if user['role'] == 'teacher':
+        response['scheduler'] = llm_scheduler.stats()
+    return jsonify(response), 200
+
 # Test Management
-@app.route('/api/assign-test', methods=['POST'])
+@api.route('/api/assign-test', methods=['POST'])
 @jwt_required()
 def assign_test():
     user_id = get_jwt_identity()
@@ -621,6 +718,9 @@ def assign_test():
         data.get('test_name'), data.get('student_ids', []), data.get('start_time'),
         data.get('end_time'), data.get('duration')
     )
+    # Per-student question/option order, derived deterministically (no per-student copies).
+    # Stays on unless explicitly turned off with false or "false"
+    shuffle = str(data.get('shuffle', True)).strip().lower() != 'false'
     if not all([test_name, student_ids, start_time, end_time, duration]):
         return jsonify({'error': 'Missing required fields'}), 400
 
@@ -654,13 +754,14 @@ def assign_test():
             "start_time": start_dt.isoformat(),  # Store in IST
             "end_time": end_dt.isoformat(),      # Store in IST
             "duration": duration,
+            "shuffle": shuffle,
             "status": "assigned"
         }}
     )
     logging.info(f"Test {test_name} assigned to {len(valid_student_ids_str)} students")
     return jsonify({'success': True, 'message': f'Test {test_name} assigned successfully'}), 200
 
-@app.route('/api/manage-test', methods=['POST'])
+@api.route('/api/manage-test', methods=['POST'])
 @jwt_required()
 def manage_test():
     user_id = get_jwt_identity()
@@ -718,7 +819,7 @@ def manage_test():
     return jsonify({'error': 'Invalid action'}), 400
 
 # Test Submission and Results
-@app.route('/api/save-test-result', methods=['POST'])
+@api.route('/api/save-test-result', methods=['POST'])
 @jwt_required()
 def save_test_result():
     user_id = get_jwt_identity()
@@ -748,14 +849,19 @@ def save_test_result():
         if test['status'] != "active" or now < test['start_time'] or (test.get('end_time') and now > test['end_time']):
             return jsonify({"message": "Test not active or time expired"}), 403
 
-        tests_collection.update_one({"test_name": test_name}, {"$set": {f"result.{user_id}": result}})
+        if test.get('shuffle') and isinstance(result, dict):
+            # Answers arrive keyed by the student's shuffled positions; store and score them canonically
+            answers = canonical_answers(test, user_id, result.get('answers'))
+            result = {**result, 'answers': answers, 'score': score_answers(test, answers), 'totalQuestions': len(test['mcqs'])}
+
+        tests_collection.update_one({"_id": test["_id"]}, {"$set": {f"result.{user_id}": result}})
         logging.info(f"Response: Result saved for test {test_name}")
         return jsonify({"message": "Test result saved"}), 200
     except Exception as e:
         logging.error(f"Error in /api/save-test-result: {str(e)}")
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
-@app.route('/api/user-tests', methods=['GET'])
+@api.route('/api/user-tests', methods=['GET'])
 @jwt_required()
 def get_user_tests():
     user_id = get_jwt_identity()
@@ -790,11 +896,15 @@ def get_user_tests():
                         {"$set": {"status": "stopped"}}
                     )
                     test["status"] = "stopped"
-        test["_id"] = str(test["_id"])
+        if test.get('shuffle') and user['role'] == 'student':
+            own_result = test.get("result", {}).get(user_id)
+            if own_result:
+                test["result"][user_id] = {**own_result, "answers": student_answers(test, user_id, own_result.get("answers"))}
+            test["mcqs"] = shuffled_mcqs(test, user_id)
     logging.info(f"Retrieved {len(tests)} tests for user {user_id}")
     return jsonify(tests), 200
 
-@app.route('/api/student-results', methods=['GET'])
+@api.route('/api/student-results', methods=['GET'])
 @jwt_required()
 def get_student_results():
     user_id = get_jwt_identity()
@@ -813,7 +923,58 @@ def get_student_results():
     logging.info(f"Retrieved results for test {test_name}")
     return jsonify({'test_name': test_name, 'results': test.get('result', {})}), 200
 
-@app.route('/api/export-results', methods=['GET'])
+@api.route('/api/live-feed/token', methods=['POST'])
+@jwt_required()
+def live_feed_token():
+    """Short-lived token, valid only for one test's live feed, for the EventSource URL."""
+    user_id = get_jwt_identity()
+    user = users_collection.find_one({"_id": ObjectId(user_id)})
+    if user['role'] != 'teacher':
+        return jsonify({'error': 'Only teachers can view the live feed'}), 403
+
+    test_name = (request.get_json(silent=True) or {}).get('test_name')
+    if not test_name:
+        return jsonify({'error': 'Test name required'}), 400
+    if not tests_collection.find_one({"user_id": user_id, "test_name": test_name}, {"_id": 1}):
+        return jsonify({'error': 'Test not found'}), 404
+
+    token = create_access_token(
+        identity=user_id,
+        expires_delta=timedelta(seconds=LIVE_FEED_TOKEN_SECONDS),
+        additional_claims={'scope': 'live_feed', 'test_name': test_name}
+    )
+    return jsonify({'token': token, 'expires_in': LIVE_FEED_TOKEN_SECONDS}), 200
+
+@api.route('/api/live-feed', methods=['GET'])
+@jwt_required(locations=['query_string'])  # EventSource cannot set headers; pass ?jwt=<live feed token>
+def live_feed():
+    """Server-sent events for submissions and status changes of one test."""
+    claims = get_jwt()
+    if claims.get('scope') != 'live_feed' or claims.get('test_name') != request.args.get('test_name'):
+        return jsonify({'error': 'Use a token from /api/live-feed/token for this test'}), 403
+    if not (current_app.config.get('LIVE_FEED_STREAMING') or cooperative_workers()):
+        return jsonify({'error': 'Live feed needs SERVING_MODE=gevent; poll /api/student-results instead'}), 501
+    user_id = get_jwt_identity()
+    user = users_collection.find_one({"_id": ObjectId(user_id)})
+    if user['role'] != 'teacher':
+        return jsonify({'error': 'Only teachers can view the live feed'}), 403
+
+    test_name = request.args.get('test_name')
+    if not test_name:
+        return jsonify({'error': 'Test name required'}), 400
+
+    test = tests_collection.find_one({"user_id": user_id, "test_name": test_name}, {"_id": 1})
+    if not test:
+        return jsonify({'error': 'Test not found'}), 404
+
+    logging.info(f"Live feed opened for test {test_name} by user {user_id}")
+    events = live_feed_hub.stream(test["_id"], current_app.json.dumps)
+    return Response(stream_with_context(events), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@api.route('/api/export-results', methods=['GET'])
 @jwt_required()
 def export_results():
     user_id = get_jwt_identity()
@@ -846,7 +1007,7 @@ def export_results():
     )
 
 # Student Management
-@app.route('/api/students', methods=['GET'])
+@api.route('/api/students', methods=['GET'])
 @jwt_required()
 def get_students():
     user_id = get_jwt_identity()
@@ -855,11 +1016,10 @@ def get_students():
         return jsonify({'error': 'Only teachers can view students'}), 403
 
     students = list(users_collection.find({"role": "student"}, {"_id": 1, "name": 1, "email": 1}))
-    response = [{**student, "_id": str(student["_id"])} for student in students]
-    logging.info(f"Retrieved {len(response)} students")
-    return jsonify(response), 200
+    logging.info(f"Retrieved {len(students)} students")
+    return jsonify(students), 200
 
-@app.route('/api/students/update', methods=['PUT'])
+@api.route('/api/students/update', methods=['PUT'])
 @jwt_required()
 def update_student():
     user_id = get_jwt_identity()
@@ -879,7 +1039,7 @@ def update_student():
 
     update_data = {"name": name, "email": email}
     if password:
-        update_data["password"] = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        update_data["password"] = hash_password(password)
 
     result = users_collection.update_one({"_id": student_obj_id, "role": "student"}, {"$set": update_data})
     if result.matched_count == 0:
@@ -888,7 +1048,7 @@ def update_student():
     logging.info(f"Student {student_id} updated by teacher {user_id}")
     return jsonify({'message': 'Student updated successfully'}), 200
 
-@app.route('/api/students/delete', methods=['DELETE'])
+@api.route('/api/students/delete', methods=['DELETE'])
 @jwt_required()
 def delete_student():
     user_id = get_jwt_identity()
@@ -913,6 +1073,16 @@ def delete_student():
     logging.info(f"Student {student_id} deleted by teacher {user_id}")
     return jsonify({'message': 'Student deleted successfully'}), 200
 
+app = create_app()
+
 if __name__ == '__main__':
+    # With the reloader, this module runs in a watcher process and again in the
+    # serving child; only the child (WERKZEUG_RUN_MAIN) starts background jobs
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        from jobs import start_scheduler
+        start_scheduler()
     logging.info("Starting Flask server...")
+    # The dev server runs each request in its own thread, so streams are fine
+    app.config['LIVE_FEED_STREAMING'] = True
+    llm_scheduler.queueing = True
     app.run(debug=True, host='0.0.0.0', port=5001)
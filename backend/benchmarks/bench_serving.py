@@ -0,0 +1,287 @@
+"""Compare concurrent-request capacity per core of the sync and gevent serving modes.
+
+Runs the real app (`app:app`) in a single gunicorn worker (one core) for each
+worker class and drives real routes with concurrent clients:
+
+  user-tests        one Mongo query per request
+  save-test-result  Mongo reads and a write per request
+  generate-mcqs     PDF extraction, Mongo and an LLM call per request
+
+Upstreams are real sockets with added latency, so the numbers show whether
+pymongo and the httpx-based Groq client actually yield under gevent:
+
+  - Groq is a local HTTP stub that answers chat completions after --latency.
+  - Mongo is a mongod (--mongo-uri, default $MONGO_DB_URI) reached through a
+    local TCP proxy that delays every request by --mongo-latency. The benchmark
+    seeds and then drops its own database (--db-name); use a throwaway mongod.
+
+    python benchmarks/bench_serving.py --mongo-uri mongodb://127.0.0.1:27017 --concurrency 50
+"""
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from statistics import median
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+JWT_SECRET = "bench-secret-key-for-serving-benchmark"
+TEST_NAME = "bench-test"
+MCQ = {
+    "question": "Which organelle carries out photosynthesis?",
+    "options": ["Chloroplast", "Mitochondrion", "Nucleus", "Ribosome"],
+    "correct_answer": "Chloroplast",
+    "type": "theory",
+    "relevance_score": 0.9,
+}
+
+
+def groq_stub(latency):
+    """Threaded HTTP server answering any POST as a Groq chat completion after `latency`."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            body = json.dumps({
+                "id": "bench", "object": "chat.completion", "created": int(time.time()), "model": "bench",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": json.dumps([MCQ, MCQ])}}],
+                "usage": {"prompt_tokens": 600, "completion_tokens": 200, "total_tokens": 800},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def latency_proxy(upstream, latency):
+    """TCP proxy that holds every client->server packet for `latency` seconds."""
+    listener = socket.create_server(("127.0.0.1", 0))
+
+    def pump(src, dst, delay):
+        try:
+            while True:
+                data = src.recv(65536)
+                if not data:
+                    break
+                if delay:
+                    time.sleep(delay)
+                dst.sendall(data)
+        except OSError:
+            pass
+        finally:
+            for sock in (src, dst):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def accept():
+        while True:
+            client, _ = listener.accept()
+            server = socket.create_connection(upstream)
+            threading.Thread(target=pump, args=(client, server, latency), daemon=True).start()
+            threading.Thread(target=pump, args=(server, client, 0), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return listener.getsockname()[1]
+
+
+def make_pdf():
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Photosynthesis converts light energy into chemical energy in chloroplasts.")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def seed(db, upload_dir):
+    """Create a teacher, a student, an active assigned test and a stored PDF blob."""
+    import bcrypt
+    from pytz import timezone
+    now = datetime.now(timezone('Asia/Kolkata'))
+    password = bcrypt.hashpw(b"bench", bcrypt.gensalt())
+    teacher = db.users.insert_one({"name": "Teacher", "email": "t@bench", "password": password, "role": "teacher"}).inserted_id
+    student = db.users.insert_one({"name": "Student", "email": "s@bench", "password": password, "role": "student"}).inserted_id
+
+    pdf = make_pdf()
+    blob_id = hashlib.sha256(pdf).hexdigest()
+    path = os.path.join(upload_dir, "blobs", blob_id[:2], f"{blob_id}.pdf")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(pdf)
+    db.blobs.insert_one({"_id": blob_id, "refs": {}, "last_used": now.isoformat(), "size": len(pdf), "pages": 1})
+
+    db.tests.insert_one({
+        "user_id": str(teacher), "test_name": TEST_NAME, "pdf_name": "bench.pdf", "pdf_hash": blob_id,
+        "mcqs": [{**MCQ, "difficulty": "medium"}] * 5, "status": "active", "shuffle": False,
+        "assigned_to": [str(student)], "result": {},
+        "start_time": (now - timedelta(hours=1)).isoformat(), "end_time": (now + timedelta(days=1)).isoformat(),
+    })
+    return str(teacher), str(student), blob_id
+
+
+def bearer(user_id):
+    from flask import Flask
+    from flask_jwt_extended import JWTManager, create_access_token
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = JWT_SECRET
+    JWTManager(app)
+    with app.app_context():
+        return {"Authorization": f"Bearer {create_access_token(identity=user_id, expires_delta=timedelta(hours=2))}"}
+
+
+def scenarios(teacher, student, blob_id):
+    """Route name -> function building a urllib Request against a base URL."""
+    teacher_auth, student_auth = bearer(teacher), bearer(student)
+    result = json.dumps({"test_name": TEST_NAME, "result": {
+        "score": 3, "totalQuestions": 5, "answers": {"0": "Chloroplast"}, "timeSpent": 60}}).encode()
+    form = urllib.parse.urlencode({
+        "pdf_path": blob_id, "pdf_name": "bench.pdf", "test_name": "bench-generated",
+        "difficulty": json.dumps({"easy": 0, "medium": 2, "hard": 0}),
+    }).encode()
+    return {
+        "user-tests": lambda base: urllib.request.Request(f"{base}/api/user-tests", headers=teacher_auth),
+        "save-test-result": lambda base: urllib.request.Request(
+            f"{base}/api/save-test-result", data=result, method="POST",
+            headers={**student_auth, "Content-Type": "application/json"}),
+        "generate-mcqs": lambda base: urllib.request.Request(
+            f"{base}/api/generate-mcqs", data=form, method="POST",
+            headers={**teacher_auth, "Content-Type": "application/x-www-form-urlencoded"}),
+    }
+
+
+def drive(build, base, concurrency, duration):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            try:
+                urllib.request.urlopen(build(base), timeout=120).read()
+                with lock:
+                    latencies.append(time.monotonic() - start)
+            except Exception:
+                with lock:
+                    errors += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors
+
+
+def run_mode(worker_class, port, env, routes, args):
+    cmd = [
+        sys.executable, "-m", "gunicorn", "app:app",
+        "-b", f"127.0.0.1:{port}", "-w", "1", "-k", worker_class,
+        "--worker-connections", "1000", "--timeout", "300", "-c", "/dev/null",
+    ]
+    server = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    rps = {}
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f"{base}/healthz", timeout=5).read()
+                break
+            except Exception:
+                time.sleep(0.2)
+        for name, build in routes.items():
+            latencies, errors = drive(build, base, args.concurrency, args.duration)
+            rps[name] = len(latencies) / args.duration
+            p50 = median(latencies) if latencies else float('nan')
+            print(f"{worker_class:>7} {name:>17}: {rps[name]:8.1f} req/s per core  p50 {p50 * 1000:8.1f} ms  errors {errors}")
+    finally:
+        server.terminate()
+        server.wait()
+    return rps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mongo-uri', default=os.getenv("MONGO_DB_URI"), help="throwaway mongod to seed and drop")
+    parser.add_argument('--db-name', default="mcq_bench")
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.5, help="Groq stub response time in seconds")
+    parser.add_argument('--mongo-latency', type=float, default=0.05, help="added delay per Mongo request in seconds")
+    parser.add_argument('--duration', type=float, default=10, help="seconds per route and mode")
+    parser.add_argument('--routes', default="user-tests,save-test-result,generate-mcqs")
+    args = parser.parse_args()
+    if not args.mongo_uri:
+        parser.error("a mongod is required: pass --mongo-uri or set MONGO_DB_URI")
+
+    from pymongo import MongoClient
+    mongo = MongoClient(args.mongo_uri)
+    mongo.admin.command('ping')
+    host, port = mongo.address
+    db = mongo[args.db_name]
+    mongo.drop_database(args.db_name)
+    upload_dir = tempfile.mkdtemp(prefix="bench-uploads-")
+    teacher, student, blob_id = seed(db, upload_dir)
+    stub = groq_stub(args.latency)
+    proxy_port = latency_proxy((host, port), args.mongo_latency)
+    env = {
+        **os.environ,
+        "JWT_SECRET_KEY": JWT_SECRET,
+        "MONGO_DB_URI": f"mongodb://127.0.0.1:{proxy_port}/?directConnection=true",
+        "MONGO_DB_NAME": args.db_name,
+        "UPLOAD_DIR": upload_dir,
+        "GROQ_API_KEY": "bench",
+        "GROQ_BASE_URL": f"http://127.0.0.1:{stub.server_address[1]}",
+        # Measure the serving stack, not the production rate limits and budgets
+        "WEB_CONCURRENCY": "1",
+        "LLM_REQUESTS_PER_MINUTE": "1000000",
+        "LLM_TOKENS_PER_MINUTE": "1000000000",
+        "LLM_MAX_CONCURRENCY": "1000",
+        "LLM_MAX_QUEUE_BULK": "100000",
+        "LLM_DAILY_TOKENS_TEACHER": "0",
+        "RUN_SCHEDULER": "0",
+    }
+    all_routes = scenarios(teacher, student, blob_id)
+    routes = {name: all_routes[name] for name in args.routes.split(",")}
+
+    print(f"{args.concurrency} concurrent clients, Groq {args.latency}s, Mongo +{args.mongo_latency}s per request, 1 worker")
+    try:
+        sync_rps = run_mode("sync", 5101, env, routes, args)
+        gevent_rps = run_mode("gevent", 5102, env, routes, args)
+    finally:
+        mongo.drop_database(args.db_name)
+        stub.shutdown()
+    for name in routes:
+        if sync_rps.get(name):
+            print(f"{name:>17} gevent/sync capacity ratio: {gevent_rps[name] / sync_rps[name]:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Measure cold import time and first-request latency of the backend.
+
+Each sample runs in a fresh interpreter so nothing is cached between runs.
+No database or network access is needed: clients are created lazily.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from statistics import median
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+client = app.app.test_client()
+response = client.get('/healthz')
+t2 = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "first_request_ms": (t2 - t1) * 1000}))
+"""
+
+
+def sample():
+    env = {
+        **os.environ,
+        "JWT_SECRET_KEY": os.getenv("JWT_SECRET_KEY", "bench-secret"),
+        "MONGO_DB_URI": os.getenv("MONGO_DB_URI", "mongodb://127.0.0.1:1"),
+    }
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    samples = [sample() for _ in range(args.runs)]
+    for key in ("import_ms", "first_request_ms"):
+        values = [s[key] for s in samples]
+        print(f"{key:>17}: median {median(values):8.1f}  min {min(values):8.1f}  max {max(values):8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+import re
+import math
+import random
+import hashlib
+import logging
+from collections import Counter
+
+# Markers of front/back matter that rarely yield examinable questions. Words
+# like "index" or "references" are ordinary vocabulary in body text, so they
+# only count as a heading on a line of their own.
+STRONG_BOILERPLATE_PATTERNS = [
+    re.compile(r"all rights reserved", re.IGNORECASE),
+    re.compile(r"\bisbn(-1[03])?\b", re.IGNORECASE),
+]
+# A table of contents line: "Chapter 2 Sets ........ 14"
+DOT_LEADER_RE = re.compile(r"(?:\.\s?){5,}\s*\d+\s*$", re.MULTILINE)
+HEADING_BOILERPLATE_RE = re.compile(
+    r"^\s*(table of contents|contents|preface|foreword|acknowledg(e)?ments?|bibliography|references|index|glossary)\s*$",
+    re.IGNORECASE | re.MULTILINE
+)
+WEAK_BOILERPLATE_PATTERNS = [
+    re.compile(r"\bcopyright\b|©", re.IGNORECASE),
+    re.compile(r"printed in|published by", re.IGNORECASE),
+]
+WORD_RE = re.compile(r"[a-zA-Z][a-zA-Z\-]{2,}")
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+FORMULA_RE = re.compile(r"[=+\-*/^×÷%]\s*\d|\d\s*[=+\-*/^×÷%]")
+STOPWORDS = set("""
+the and for are but not you all any can had her was one our out day get has him his how man new now old see two
+way who boy did its let put say she too use that with this from they will have been were what when your which their
+there would about could other into than then them these some such only also more most very just over each where
+""".split())
+
+# Prior pseudo-counts: how many observed questions it takes for acceptance
+# history to outweigh the local content score
+PRIOR_WEIGHT = 4.0
+# Bump when score_chunks changes so cached scores are recomputed
+SCORES_VERSION = 1
+
+
+def document_key(text):
+    """Stable identifier for a document's extracted text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def tokenize(text):
+    return [w for w in (m.group(0).lower() for m in WORD_RE.finditer(text)) if w not in STOPWORDS]
+
+
+def boilerplate_score(text):
+    """How much the chunk looks like front/back matter, from 0 (body text) to 1.
+
+    A single weak marker (e.g. one mention of copyright) is ignored; strong
+    markers and section headings count double.
+    """
+    markers = 2 * sum(1 for pattern in STRONG_BOILERPLATE_PATTERNS if pattern.search(text))
+    if len(DOT_LEADER_RE.findall(text)) >= 3:
+        markers += 2
+    markers += 2 * len(set(m.group(1).lower() for m in HEADING_BOILERPLATE_RE.finditer(text)))
+    markers += sum(1 for pattern in WEAK_BOILERPLATE_PATTERNS if pattern.search(text))
+    return 0.0 if markers < 2 else min(1.0, markers / 6)
+
+
+def numeric_density(text):
+    """Share of numbers and inline formulas relative to words."""
+    words = max(1, len(WORD_RE.findall(text)))
+    numbers = len(NUMBER_RE.findall(text))
+    formulas = len(FORMULA_RE.findall(text))
+    return min(1.0, (numbers + 3 * formulas) / words)
+
+
+def score_chunks(chunks, question_type="mixed"):
+    """Score chunks in [0, 1] from cheap local signals, higher meaning more likely to yield questions.
+
+    `question_type` ("mixed", "theory" or "numerical") favours or penalises
+    chunks dense in numbers and formulas.
+    """
+    if not chunks:
+        return []
+    tokenized = [tokenize(chunk) for chunk in chunks]
+    doc_freq = Counter()
+    for tokens in tokenized:
+        doc_freq.update(set(tokens))
+    n_chunks = len(chunks)
+
+    raw_scores = []
+    for chunk, tokens in zip(chunks, tokenized):
+        if not tokens:
+            raw_scores.append(0.0)
+            continue
+        counts = Counter(tokens)
+        # Mean TF-IDF of the chunk's top terms: dense, distinctive vocabulary
+        tfidf = sorted(
+            (count / len(tokens)) * math.log((1 + n_chunks) / (1 + doc_freq[term]) + 1)
+            for term, count in counts.items()
+        )[-20:]
+        keyword_density = sum(tfidf) / len(tfidf)
+        lexical_richness = min(1.0, len(tokens) / 400)
+        numeric = numeric_density(chunk)
+        if question_type == "numerical":
+            numeric_factor = 0.5 + numeric
+        elif question_type == "theory":
+            numeric_factor = 1.0 - 0.7 * numeric
+        else:
+            numeric_factor = 1.0 + 0.25 * min(numeric, 0.4)
+        boilerplate_penalty = 1.0 - 0.9 * boilerplate_score(chunk)
+        raw_scores.append(keyword_density * lexical_richness * numeric_factor * boilerplate_penalty)
+
+    top = max(raw_scores) or 1.0
+    return [score / top for score in raw_scores]
+
+
+class ChunkSampler:
+    """Samples chunks without replacement, biased by local scores and learned acceptance rates.
+
+    Acceptance history is persisted per document (keyed by `document_key`) in
+    `stats_collection`, so repeat generations from the same PDF favour chunks that
+    produced accepted questions before. Local scores are cached in the same
+    document, so a PDF is only tokenized and scored once per question type.
+    """
+
+    def __init__(self, chunks, doc_key, stats_collection=None, question_type="mixed"):
+        self.doc_key = doc_key
+        self.stats_collection = stats_collection
+        scores_field = f"scores_v{SCORES_VERSION}.{question_type}"
+        doc = self._load(scores_field)
+        self.history = {int(idx): stats for idx, stats in doc.get("chunks", {}).items()}
+        cached = doc.get(f"scores_v{SCORES_VERSION}", {}).get(question_type)
+        if cached is not None and len(cached) == len(chunks):
+            self.scores = cached
+        else:
+            self.scores = score_chunks(chunks, question_type)
+            self._save_scores(scores_field)
+
+    def _load(self, scores_field):
+        if self.stats_collection is None:
+            return {}
+        try:
+            return self.stats_collection.find_one({"doc_key": self.doc_key}, {"chunks": 1, scores_field: 1}) or {}
+        except Exception as e:
+            logging.warning(f"Could not load chunk stats for {self.doc_key[:12]}: {str(e)}")
+            return {}
+
+    def _save_scores(self, scores_field):
+        if self.stats_collection is None:
+            return
+        try:
+            self.stats_collection.update_one({"doc_key": self.doc_key}, {"$set": {scores_field: self.scores}}, upsert=True)
+        except Exception as e:
+            logging.warning(f"Could not save chunk scores for {self.doc_key[:12]}: {str(e)}")
+
+    def weight(self, idx):
+        """Posterior acceptance estimate with the local score as prior."""
+        prior = self.scores[idx]
+        stats = self.history.get(idx, {})
+        attempts = stats.get("attempts", 0)
+        accepted = stats.get("accepted", 0)
+        return (accepted + PRIOR_WEIGHT * prior) / (attempts + PRIOR_WEIGHT) + 1e-3
+
+    def choose(self, excluded):
+        """Pick a chunk index not in `excluded`, or None when all are exhausted."""
+        candidates = [i for i in range(len(self.scores)) if i not in excluded]
+        if not candidates:
+            return None
+        weights = [self.weight(i) ** 2 for i in candidates]  # sharpen towards high-yield chunks
+        return random.choices(candidates, weights=weights, k=1)[0]
+
+    def record(self, idx, requested, accepted):
+        """Record how many of the requested questions from a chunk were accepted."""
+        stats = self.history.setdefault(idx, {"attempts": 0, "accepted": 0})
+        stats["attempts"] += requested
+        stats["accepted"] += accepted
+        if self.stats_collection is None:
+            return
+        try:
+            self.stats_collection.update_one(
+                {"doc_key": self.doc_key},
+                {"$inc": {f"chunks.{idx}.attempts": requested, f"chunks.{idx}.accepted": accepted}},
+                upsert=True
+            )
+        except Exception as e:
+            logging.warning(f"Could not save chunk stats for {self.doc_key[:12]}: {str(e)}")
@@ -0,0 +1,46 @@
+import os
+import threading
+
+DB_NAME = os.getenv("MONGO_DB_NAME", 'mcq_generator')
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_db():
+    """Return the Mongo database, connecting on first use in each process.
+
+    Clients are cached per PID so a process forked after the first connection
+    (e.g. gunicorn workers forked from a master running the scheduler) opens its
+    own connection pool instead of sharing the parent's sockets.
+    """
+    pid = os.getpid()
+    client = _clients.get(pid)
+    if client is None:
+        with _lock:
+            client = _clients.get(pid)
+            if client is None:
+                mongo_db_uri = os.getenv("MONGO_DB_URI")
+                if not mongo_db_uri:
+                    raise ValueError("MONGO_DB_URI is not set in the environment")
+                from pymongo import MongoClient
+                client = _clients[pid] = MongoClient(mongo_db_uri)
+    return client[DB_NAME]
+
+
+class LazyCollection:
+    """Stand-in for a pymongo Collection that resolves it on first attribute access."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+    def __repr__(self):
+        return f"LazyCollection({self.name!r})"
+
+
+def ping():
+    """Round-trip to the database server; raises if it is unreachable."""
+    get_db().client.admin.command('ping')
@@ -0,0 +1,38 @@
+import os
+import multiprocessing
+
+# SERVING_MODE=sync keeps one request per worker process. SERVING_MODE=gevent
+# runs each worker as a cooperative event loop: gunicorn monkey-patches sockets
+# before app.py is imported, so pymongo and the httpx-based Groq client yield
+# while waiting on Mongo or the LLM instead of pinning the whole worker.
+# CPU-bound work (fitz parsing, bcrypt, chunk scoring) still runs on the loop
+# and blocks every other greenlet in that worker while it runs.
+# The LLM scheduler's fair queue and priorities work within one process, so
+# they only take effect in gevent mode; sync workers keep the daily token
+# budgets (stored in Mongo) but never queue behind another user's call.
+SERVING_MODE = os.getenv("SERVING_MODE", "sync")
+
+if SERVING_MODE == "gevent":
+    worker_class = "gevent"
+    # One process per core; concurrency comes from greenlets, not processes
+    workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+    # Workers split per-host budgets (LLM limits, PDF pool) by this count
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    worker_connections = int(os.getenv("GEVENT_WORKER_CONNECTIONS", "200"))
+    # The heartbeat stalls while CPU-bound work hogs the loop; allow for the slowest
+    timeout = int(os.getenv("GUNICORN_TIMEOUT", "180"))
+    keepalive = 5
+else:
+    # gunicorn's own defaults (and the command line) apply unchanged
+    worker_class = "sync"
+
+
+def post_worker_init(worker):
+    """Start background jobs inside each worker once it has forked.
+
+    The master forks workers, so threads started there would not carry over
+    (and would also run in a process that serves no requests). Jobs hold a
+    Mongo lease, so only one worker actually runs each one.
+    """
+    from jobs import start_scheduler
+    start_scheduler()
@@ -0,0 +1,108 @@
+import os
+import socket
+import logging
+from datetime import datetime, timedelta
+
+from pytz import timezone
+
+from database import LazyCollection
+from storage import BlobStore
+
+IST = timezone('Asia/Kolkata')
+
+# Set RUN_SCHEDULER=0 on web instances when a dedicated `python jobs.py` runs the jobs
+RUN_SCHEDULER = os.getenv("RUN_SCHEDULER", "1") == "1"
+LEASE_SECONDS = 90
+
+tests_collection = LazyCollection('tests')
+locks_collection = LazyCollection('locks')
+blob_store = BlobStore(collection=LazyCollection('blobs'))
+
+_scheduler = None
+
+
+def _owner():
+    # Evaluated per call: a forked process must not inherit its parent's identity
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_lease(name, seconds=LEASE_SECONDS):
+    """Take or renew a Mongo-backed lease so only one process across all hosts runs a job."""
+    from pymongo.errors import DuplicateKeyError
+    now = datetime.now(IST)
+    owner = _owner()
+    try:
+        locks_collection.find_one_and_update(
+            {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lt": now.isoformat()}}]},
+            {"$set": {"owner": owner, "expires_at": (now + timedelta(seconds=seconds)).isoformat()}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The lease exists and is held by another live process
+        return False
+
+
+def update_test_status():
+    """Background task to update test statuses based on IST time."""
+    if not acquire_lease('update_test_status'):
+        return
+    now = datetime.now(IST).isoformat()
+    tests = tests_collection.find({"status": {"$in": ["assigned", "active"]}})
+    for test in tests:
+        start_time = test.get("start_time")
+        end_time = test.get("end_time")
+        if not start_time or not end_time:
+            continue
+        if now >= start_time and now <= end_time and test["status"] != "active":
+            tests_collection.update_one(
+                {"_id": test["_id"]},
+                {"$set": {"status": "active"}}
+            )
+            logging.info(f"Test {test['test_name']} auto-set to active")
+        elif now > end_time and test["status"] != "stopped":
+            tests_collection.update_one(
+                {"_id": test["_id"]},
+                {"$set": {"status": "stopped"}}
+            )
+            logging.info(f"Test {test['test_name']} auto-set to stopped")
+
+
+def collect_blob_garbage():
+    """Sweep unreferenced PDF blobs and abandoned partial uploads."""
+    if acquire_lease('collect_blob_garbage', seconds=20 * 60):
+        blob_store.collect_garbage()
+
+
+def start_scheduler():
+    """Start the background scheduler in this process.
+
+    Call it in each serving process after it has forked (gunicorn's
+    post_worker_init), never in a process that forks afterwards: threads do
+    not survive a fork. Every job takes a Mongo lease first, so only one
+    process across all workers and hosts runs it at a time.
+    """
+    global _scheduler
+    if _scheduler is not None or not RUN_SCHEDULER:
+        return _scheduler
+    from apscheduler.schedulers.background import BackgroundScheduler
+    _scheduler = BackgroundScheduler()
+    # Schedule status updates every minute
+    _scheduler.add_job(update_test_status, 'interval', minutes=1)
+    _scheduler.add_job(collect_blob_garbage, 'interval', minutes=15)
+    _scheduler.start()
+    logging.info(f"Background scheduler started in {_owner()}")
+    return _scheduler
+
+
+if __name__ == '__main__':
+    # Dedicated scheduler process: python jobs.py
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    from apscheduler.schedulers.blocking import BlockingScheduler
+    scheduler = BlockingScheduler()
+    scheduler.add_job(update_test_status, 'interval', minutes=1)
+    scheduler.add_job(collect_blob_garbage, 'interval', minutes=15)
+    logging.info(f"Dedicated scheduler running in {_owner()}")
+    scheduler.start()
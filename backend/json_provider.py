@@ -0,0 +1,64 @@
+import os
+import gzip
+import json
+import base64
+from datetime import datetime, date
+
+from bson import ObjectId
+from flask import request
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+# Gzip JSON responses at least this large when the client accepts it (0 disables)
+JSON_COMPRESS_MIN_BYTES = int(os.getenv("JSON_COMPRESS_MIN_BYTES", "2048"))
+JSON_COMPRESS_LEVEL = int(os.getenv("JSON_COMPRESS_LEVEL", "5"))
+
+BCRYPT_PREFIX = b"$2"
+
+
+def _default(obj):
+    """Encode BSON/Mongo types that the JSON encoders don't support natively."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, bytes):
+        # User documents store the bcrypt hash as bytes; never let it reach a response
+        if obj.startswith(BCRYPT_PREFIX):
+            raise TypeError("Refusing to serialize a password hash")
+        return base64.b64encode(obj).decode('ascii')
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson with BSON support and optional gzip."""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=_default).decode('utf-8')
+        kwargs.setdefault("default", _default)
+        kwargs.setdefault("ensure_ascii", False)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def _encode(self, obj):
+        if orjson is not None:
+            return orjson.dumps(obj, default=_default)
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+    def response(self, *args, **kwargs):
+        body = self._encode(self._prepare_response_obj(args, kwargs))
+        response = self._app.response_class(body, mimetype="application/json")
+        if JSON_COMPRESS_MIN_BYTES and len(body) >= JSON_COMPRESS_MIN_BYTES and "gzip" in request.accept_encodings:
+            response.set_data(gzip.compress(body, compresslevel=JSON_COMPRESS_LEVEL))
+            response.headers["Content-Encoding"] = "gzip"
+            response.vary.add("Accept-Encoding")
+        return response
@@ -0,0 +1,241 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+# Polling interval used when change streams are unavailable (standalone mongod)
+LIVE_FEED_POLL_SECONDS = float(os.getenv("LIVE_FEED_POLL_SECONDS", "2"))
+# SSE comment sent on idle connections so proxies keep them open
+LIVE_FEED_HEARTBEAT_SECONDS = 15
+# Events buffered per connected client before it is considered too slow
+SUBSCRIBER_QUEUE_SIZE = 100
+# How long a new client waits for the watcher's first read of the test
+LIVE_FEED_READY_SECONDS = 10
+
+# Mongo error code for "The $changeStream stage is only supported on replica sets"
+CHANGE_STREAMS_UNSUPPORTED = 40573
+
+
+def cooperative_workers():
+    """True when this process serves requests on gevent greenlets.
+
+    A live feed response stays open for as long as the teacher watches. On a
+    sync worker that pins the whole process until gunicorn's timeout kills it.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+class TestWatcher(threading.Thread):
+    """Watches one test document and fans its events out to every subscriber.
+
+    Uses a change stream when the deployment supports it and falls back to
+    polling the test's status and result keys otherwise. Either way there is a
+    single watcher per test no matter how many teachers are connected.
+
+    The watcher reads the test itself, after its change stream is open, so no
+    submission can land between the snapshot and the first streamed change.
+    State changes and fan-out happen under `lock` and are numbered, so a
+    client's snapshot and its queued events never overlap or leave a gap.
+    """
+
+    def __init__(self, hub, collection, test_id):
+        super().__init__(daemon=True, name=f"live-feed-{test_id}")
+        self.hub = hub
+        self.collection = collection
+        self.test_id = test_id
+        self.status = None
+        self.results = {}
+        self.seq = 0
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+
+    def _publish(self, event, data):
+        # Caller holds self.lock
+        self.seq += 1
+        for subscriber in self.subscribers:
+            try:
+                subscriber.put_nowait((self.seq, event, data))
+            except queue.Full:
+                logging.warning(f"Live feed subscriber for test {self.test_id} is lagging, dropping event")
+
+    def publish(self, event, data):
+        with self.lock:
+            self._publish(event, data)
+
+    def snapshot(self):
+        """Current state and the sequence number of the last event it includes."""
+        with self.lock:
+            return self.seq, {"status": self.status, "submitted": sorted(self.results)}
+
+    def _apply_status(self, status):
+        with self.lock:
+            if status and status != self.status:
+                self.status = status
+                self._publish("status", {"status": status})
+
+    def _apply_results(self, results):
+        with self.lock:
+            for student_id, result in (results or {}).items():
+                previous = self.results.get(student_id)
+                if previous == result:
+                    continue
+                self.results[student_id] = result
+                # An overwritten result is streamed too, so the feed matches /api/student-results
+                event = "submission" if previous is None else "resubmission"
+                self._publish(event, {"student_id": student_id, "result": result})
+
+    def _load(self):
+        """Apply the test's stored status and results; False when the test is gone."""
+        # Only status and results are loaded, never the MCQs
+        doc = self.collection.find_one({"_id": self.test_id}, {"status": 1, "result": 1})
+        if doc is None:
+            self.publish("deleted", {})
+            return False
+        self._apply_status(doc.get("status"))
+        self._apply_results(doc.get("result"))
+        return True
+
+    def _handle_change(self, change):
+        operation = change["operationType"]
+        if operation == "delete":
+            self.publish("deleted", {})
+            self.stopped.set()
+            return
+        if operation == "replace":
+            doc = change.get("fullDocument") or {}
+            self._apply_status(doc.get("status"))
+            self._apply_results(doc.get("result"))
+            return
+        for key, value in change.get("updateDescription", {}).get("updatedFields", {}).items():
+            if key == "status":
+                self._apply_status(value)
+            elif key == "result":
+                self._apply_results(value)
+            elif key.startswith("result."):
+                student_id = key.split(".")[1]
+                if key.count(".") == 1:
+                    self._apply_results({student_id: value})
+
+    def _watch(self):
+        pipeline = [{"$match": {
+            "documentKey._id": self.test_id,
+            "operationType": {"$in": ["update", "replace", "delete"]}
+        }}]
+        with self.collection.watch(pipeline, max_await_time_ms=1000) as stream:
+            # Changes made while loading are replayed by the stream and deduplicated
+            if not self._load():
+                return
+            self.ready.set()
+            while not self.stopped.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    self._handle_change(change)
+
+    def _poll(self):
+        if not self._load():
+            return
+        self.ready.set()
+        while not self.stopped.wait(LIVE_FEED_POLL_SECONDS):
+            if not self._load():
+                return
+
+    def run(self):
+        from pymongo.errors import OperationFailure
+        try:
+            if self.hub.change_streams_supported is not False:
+                try:
+                    self._watch()
+                    return
+                except OperationFailure as e:
+                    if e.code != CHANGE_STREAMS_UNSUPPORTED:
+                        raise
+                    self.hub.change_streams_supported = False
+                    logging.info("Change streams unavailable, live feed falling back to polling")
+            self._poll()
+        except Exception as e:
+            logging.error(f"Live feed watcher for test {self.test_id} failed: {str(e)}")
+            self.publish("error", {"error": "Live feed interrupted"})
+        finally:
+            self.stopped.set()
+            self.ready.set()
+            self.hub.detach(self)
+
+
+class LiveFeedHub:
+    """Registry of per-test watchers shared by all SSE connections in this process."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.watchers = {}
+        self.lock = threading.Lock()
+        self.change_streams_supported = None
+
+    def subscribe(self, test_id):
+        """Register a subscriber for a test; returns (watcher, queue)."""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            watcher = self.watchers.get(test_id)
+            if watcher is None or watcher.stopped.is_set():
+                watcher = TestWatcher(self, self.collection, test_id)
+                self.watchers[test_id] = watcher
+                watcher.subscribers.add(subscriber)
+                watcher.start()
+            else:
+                with watcher.lock:
+                    watcher.subscribers.add(subscriber)
+        return watcher, subscriber
+
+    def unsubscribe(self, watcher, subscriber):
+        with self.lock:
+            with watcher.lock:
+                watcher.subscribers.discard(subscriber)
+                idle = not watcher.subscribers
+            if idle:
+                watcher.stopped.set()
+                if self.watchers.get(watcher.test_id) is watcher:
+                    del self.watchers[watcher.test_id]
+
+    def detach(self, watcher):
+        with self.lock:
+            if self.watchers.get(watcher.test_id) is watcher:
+                del self.watchers[watcher.test_id]
+
+    def stream(self, test_id, encode):
+        """Generator of SSE frames for one connected client."""
+        watcher, subscriber = self.subscribe(test_id)
+        try:
+            if not watcher.ready.wait(LIVE_FEED_READY_SECONDS):
+                yield self.frame("error", {"error": "Live feed unavailable"}, encode)
+                return
+            snapshot_seq, snapshot = watcher.snapshot()
+            yield self.frame("snapshot", snapshot, encode)
+            last_sent = time.monotonic()
+            while True:
+                try:
+                    seq, event, data = subscriber.get(timeout=1)
+                except queue.Empty:
+                    if watcher.stopped.is_set():
+                        return
+                    if time.monotonic() - last_sent >= LIVE_FEED_HEARTBEAT_SECONDS:
+                        last_sent = time.monotonic()
+                        yield ": keep-alive\n\n"
+                    continue
+                if seq <= snapshot_seq and event in ("status", "submission", "resubmission"):
+                    continue  # already part of the snapshot
+                last_sent = time.monotonic()
+                yield self.frame(event, data, encode)
+                if event in ("deleted", "error"):
+                    return
+        finally:
+            self.unsubscribe(watcher, subscriber)
+
+    @staticmethod
+    def frame(event, data, encode):
+        return f"event: {event}\ndata: {encode(data)}\n\n"
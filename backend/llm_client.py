@@ -0,0 +1,269 @@
+import os
+import time
+import random
+import logging
+import threading
+
+import httpx
+import groq
+from groq import Groq
+
+from prompts import estimate_tokens
+
+# LLM client settings (overridable through the environment)
+LLM_MODEL = os.getenv("LLM_MODEL", "meta-llama/llama-4-scout-17b-16e-instruct")
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+
+# Rate and concurrency limits are per host. The token bucket and AIMD limiter
+# live in each process, so the host budget is split evenly across the worker
+# processes gunicorn runs (WEB_CONCURRENCY, the same variable gunicorn reads).
+# Multiple hosts sharing one API key each get the full host budget.
+LLM_PROCESSES_PER_HOST = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30")) / LLM_PROCESSES_PER_HOST
+# Groq also limits tokens per minute (prompt + completion), which a 2.5k-token
+# prompt with a 1k completion budget hits well before the request limit
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "30000")) / LLM_PROCESSES_PER_HOST
+LLM_MAX_CONCURRENCY = max(1, int(os.getenv("LLM_MAX_CONCURRENCY", "8")) // LLM_PROCESSES_PER_HOST)
+LLM_POOL_CONNECTIONS = int(os.getenv("LLM_POOL_CONNECTIONS", "20"))
+
+RETRYABLE_ERRORS = (
+    groq.RateLimitError,
+    groq.APITimeoutError,
+    groq.APIConnectionError,
+    groq.InternalServerError,
+)
+
+
+class LLMUnavailableError(Exception):
+    """Raised when the provider keeps rejecting a call after all retries."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket that can be re-synced from provider headers."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, rate_per_minute / 6.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """Block until `amount` tokens are available and take them."""
+        while True:
+            wait = self.try_acquire(amount)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def try_acquire(self, amount=1):
+        """Take `amount` tokens if available; otherwise return the seconds to wait."""
+        # A charge larger than the bucket could never fit; it takes a full bucket instead
+        amount = min(amount, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.blocked_until and self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return max(self.blocked_until - now, (amount - self.tokens) / self.rate)
+
+    def credit(self, amount):
+        """Return tokens that were charged but not used."""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def sync(self, remaining=None, reset_seconds=None):
+        """Align the bucket with x-ratelimit-* values reported by the provider."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if remaining is not None:
+                self.tokens = min(self.tokens, float(remaining))
+            if reset_seconds is not None and remaining is not None and remaining <= 0:
+                self.blocked_until = max(self.blocked_until, now + reset_seconds)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for the given number of seconds (Retry-After)."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class AIMDLimiter:
+    """Adaptive concurrency limit: additive increase on success, halve on overload."""
+
+    def __init__(self, max_limit, min_limit=1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max(min_limit, max_limit // 2))
+        self.in_flight = 0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, overloaded=False):
+        with self.cond:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(self.min_limit, self.limit / 2)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1))
+            self.cond.notify_all()
+
+
+def parse_reset(value):
+    """Parse Groq reset headers such as '2m59.56s', '7.66s' or '120ms' into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    seconds, number = 0.0, ""
+    i = 0
+    while i < len(value):
+        ch = value[i]
+        if ch.isdigit() or ch == '.':
+            number += ch
+        elif value.startswith("ms", i):
+            seconds += float(number or 0) / 1000
+            number = ""
+            i += 1
+        elif ch in "hms":
+            seconds += float(number or 0) * {"h": 3600, "m": 60, "s": 1}[ch]
+            number = ""
+        i += 1
+    return seconds
+
+
+def backoff_delay(attempt, base=0.5, cap=20.0):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class LLMClient:
+    """Process-wide Groq client with a keep-alive pool, rate limiting, retries and AIMD concurrency.
+
+    Limits apply to this process only; see LLM_PROCESSES_PER_HOST.
+    """
+
+    def __init__(self, api_key, model=LLM_MODEL, requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                 max_retries=LLM_MAX_RETRIES, max_concurrency=LLM_MAX_CONCURRENCY,
+                 tokens_per_minute=LLM_TOKENS_PER_MINUTE):
+        self.model = model
+        self.max_retries = max_retries
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=LLM_POOL_CONNECTIONS,
+                max_keepalive_connections=LLM_POOL_CONNECTIONS,
+                keepalive_expiry=60,
+            ),
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+        # Retries are handled here so rate-limit headers feed this process's bucket
+        self.client = Groq(api_key=api_key, http_client=self.http_client, max_retries=0)
+        self.bucket = TokenBucket(requests_per_minute)
+        # A full minute of capacity, so a single large call always fits
+        self.token_bucket = TokenBucket(tokens_per_minute, capacity=tokens_per_minute)
+        self.limiter = AIMDLimiter(max_concurrency)
+
+    def _sync_from_headers(self, headers):
+        for bucket, kind in ((self.bucket, "requests"), (self.token_bucket, "tokens")):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_reset(headers.get(f"x-ratelimit-reset-{kind}"))
+            if remaining is not None:
+                try:
+                    bucket.sync(int(remaining), reset)
+                except ValueError:
+                    pass
+
+    @staticmethod
+    def call_cost(messages, max_completion_tokens=None):
+        """Tokens a call may consume: estimated prompt plus the completion budget."""
+        return sum(estimate_tokens(m["content"]) for m in messages) + (max_completion_tokens or 0)
+
+    def try_reserve(self, cost):
+        """Take one request and `cost` tokens if both budgets allow it; otherwise the seconds to wait."""
+        wait = self.bucket.try_acquire()
+        if wait:
+            return wait
+        wait = self.token_bucket.try_acquire(cost)
+        if wait:
+            self.bucket.credit(1)
+        return wait
+
+    def reserve(self, cost):
+        """Block until one request and `cost` tokens are available."""
+        while True:
+            wait = self.try_reserve(cost)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def chat(self, messages, timeout=None, token_reserved=False, **params):
+        """Run a chat completion and return the parsed completion object.
+
+        `token_reserved` means the caller already took this call's first
+        request and token budget (the LLM scheduler does so when it grants a
+        slot, via `try_reserve(call_cost(...))`).
+        """
+        params.setdefault("model", self.model)
+        cost = self.call_cost(messages, params.get("max_completion_tokens"))
+        call_timeout = timeout or httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt or not token_reserved:
+                self.reserve(cost)
+            self.limiter.acquire()
+            overloaded = False
+            try:
+                raw = self.client.chat.completions.with_raw_response.create(
+                    messages=messages, timeout=call_timeout, **params
+                )
+                self._sync_from_headers(raw.headers)
+                completion = raw.parse()
+                usage = getattr(completion, "usage", None)
+                if usage is not None and usage.total_tokens is not None and usage.total_tokens < cost:
+                    self.token_bucket.credit(cost - usage.total_tokens)
+                return completion
+            except RETRYABLE_ERRORS as e:
+                last_error = e
+                overloaded = isinstance(e, (groq.RateLimitError, groq.InternalServerError))
+                delay = backoff_delay(attempt)
+                response = getattr(e, "response", None)
+                if response is not None:
+                    self._sync_from_headers(response.headers)
+                    retry_after = parse_reset(response.headers.get("retry-after"))
+                    if retry_after:
+                        self.bucket.pause(retry_after)
+                        delay = max(delay, retry_after)
+                if attempt < self.max_retries:
+                    logging.warning(f"LLM call failed ({type(e).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+            finally:
+                self.limiter.release(overloaded=overloaded)
+            if attempt < self.max_retries:
+                time.sleep(delay)
+        raise LLMUnavailableError(f"LLM provider unavailable after {self.max_retries + 1} attempts: {last_error}")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(api_key):
+    """Return this process's LLM client for the API key."""
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = LLMClient(api_key)
+        return _clients[api_key]
@@ -0,0 +1,223 @@
+import os
+import heapq
+import logging
+import itertools
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from pytz import timezone
+
+IST = timezone('Asia/Kolkata')
+
+# Priority classes, served strictly in this order
+INTERACTIVE = "interactive"  # single-question regenerations
+BULK = "bulk"                # whole-test generation
+PRIORITY_RANK = {INTERACTIVE: 0, BULK: 1}
+
+# Queue positions beyond which new work is turned away with its position
+MAX_QUEUE_POSITION = {
+    INTERACTIVE: int(os.getenv("LLM_MAX_QUEUE_INTERACTIVE", "50")),
+    BULK: int(os.getenv("LLM_MAX_QUEUE_BULK", "20")),
+}
+
+# Fair-share weights: a student's share is worth twice a teacher's within a class
+ROLE_WEIGHTS = {"teacher": 1.0, "student": 2.0}
+
+# Daily token budgets per role (0 disables the quota)
+DAILY_TOKEN_BUDGET = {
+    "teacher": int(os.getenv("LLM_DAILY_TOKENS_TEACHER", "300000")),
+    "student": int(os.getenv("LLM_DAILY_TOKENS_STUDENT", "60000")),
+}
+
+
+class QueueFull(Exception):
+    """Raised by admission control when the queue is too deep for new work."""
+
+    def __init__(self, position, retry_after):
+        super().__init__(f"LLM queue is busy (position {position})")
+        self.position = position
+        self.retry_after = retry_after
+
+
+class QuotaExceeded(Exception):
+    """Raised when a user has spent their daily token budget."""
+
+    def __init__(self, used, limit):
+        super().__init__(f"Daily LLM token budget exhausted ({used}/{limit})")
+        self.used = used
+        self.limit = limit
+
+
+class FairScheduler:
+    """Weighted fair queuing for LLM calls with priority classes and per-user token budgets.
+
+    Within a priority class, each call gets a start-time fair queuing tag
+    (`max(virtual_time, user's last finish) + cost / weight`), so a user with many
+    queued calls cannot starve another user's single call. Interactive calls are
+    always served before bulk ones. Token usage is kept per user per day in
+    `usage_collection` so budgets hold across worker processes.
+
+    Slots follow the LLM client's AIMD limit, and a call's rate limit token is
+    taken before its slot is granted, so first attempts queue here in fair
+    order rather than inside the client while holding a slot.
+
+    Only the token budgets are shared between processes; the queue, virtual
+    time and slots live in this process. Fair queuing therefore only happens
+    between requests served concurrently by one process (gevent workers, the
+    threaded dev server). A sync gunicorn worker serves one request at a time,
+    so its queue never holds anyone else's call: pass `queueing=False` there
+    and admission skips queue positions instead of reporting a meaningless 0.
+    """
+
+    def __init__(self, usage_collection=None, default_slots=1, queueing=True):
+        self.queueing = queueing
+        # Used until the first call binds the client
+        self.default_slots = default_slots
+        self.client = None
+        self.usage_collection = usage_collection
+        self.in_flight = 0
+        self.queue = []
+        self.virtual_time = 0.0
+        self.last_finish = {}
+        self.seq = itertools.count()
+        self.avg_service = 5.0  # EWMA of seconds per call, used for retry hints
+        self.counters = Counter()
+        self.cond = threading.Condition()
+
+    @property
+    def slots(self):
+        """Concurrent calls allowed right now, following the client's limiter."""
+        if self.client is None:
+            return self.default_slots
+        return max(1, int(self.client.limiter.limit))
+
+    def _usage_key(self, user_id):
+        return f"{user_id}:{datetime.now(IST).strftime('%Y-%m-%d')}"
+
+    def usage(self, user_id):
+        """Today's token and call counts for a user."""
+        doc = {}
+        if self.usage_collection is not None:
+            doc = self.usage_collection.find_one({"_id": self._usage_key(user_id)}) or {}
+        return {key: doc.get(key, 0) for key in ("tokens", "prompt_tokens", "completion_tokens", "calls")}
+
+    def record_usage(self, user_id, role, usage):
+        """Count a completion's `usage` against the user's daily budget."""
+        prompt_tokens = usage.prompt_tokens or 0
+        completion_tokens = usage.completion_tokens or 0
+        self.counters["prompt_tokens"] += prompt_tokens
+        self.counters["completion_tokens"] += completion_tokens
+        if self.usage_collection is None or not user_id:
+            return
+        try:
+            self.usage_collection.update_one(
+                {"_id": self._usage_key(user_id)},
+                {
+                    "$inc": {
+                        "tokens": prompt_tokens + completion_tokens,
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "calls": 1
+                    },
+                    "$setOnInsert": {"user_id": user_id, "role": role, "date": datetime.now(IST).strftime('%Y-%m-%d')}
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logging.warning(f"Could not record LLM usage for {user_id}: {str(e)}")
+
+    def position(self, priority):
+        """Number of calls that would be served before a new call of this class."""
+        rank = PRIORITY_RANK[priority]
+        with self.cond:
+            waiting = sum(1 for entry in self.queue if entry[0] <= rank)
+            return waiting + max(0, self.in_flight - self.slots + 1)
+
+    def admit(self, user_id, role, priority):
+        """Admission control for a new request; raises QuotaExceeded or QueueFull.
+
+        Returns the queue position, or None when this process does not queue.
+        """
+        limit = DAILY_TOKEN_BUDGET.get(role, 0)
+        if limit:
+            used = self.usage(user_id)["tokens"]
+            if used >= limit:
+                self.counters["rejected_quota"] += 1
+                raise QuotaExceeded(used, limit)
+        if not self.queueing:
+            self.counters[f"admitted_{priority}"] += 1
+            return None
+        position = self.position(priority)
+        if position > MAX_QUEUE_POSITION[priority]:
+            self.counters[f"rejected_{priority}"] += 1
+            raise QueueFull(position, round(position * self.avg_service / self.slots, 1))
+        self.counters[f"admitted_{priority}"] += 1
+        return position
+
+    def _wait_turn(self, entry, tokens):
+        """Block (holding `cond`) until `entry` heads the queue, a slot is free and its budget is taken."""
+        while True:
+            if self.queue[0] is entry and self.in_flight < self.slots:
+                wait = self.client.try_reserve(tokens) if self.client is not None else 0.0
+                if not wait:
+                    return
+                # Stay at the head: a higher priority arrival takes over the next token
+                self.cond.wait(wait)
+            else:
+                self.cond.wait()
+
+    @contextmanager
+    def slot(self, user_id, role, priority=BULK, cost=1.0, client=None, tokens=0):
+        """Wait for this call's fair turn, then hold one LLM slot.
+
+        With `client`, slots follow its limiter, and one request plus `tokens`
+        (see `LLMClient.call_cost`) are already reserved from its rate limits
+        on entry: call `client.chat(..., token_reserved=True)`.
+        """
+        with self.cond:
+            if client is not None:
+                self.client = client
+            start_tag = max(self.virtual_time, self.last_finish.get(user_id, 0.0))
+            self.last_finish[user_id] = start_tag + cost / ROLE_WEIGHTS.get(role, 1.0)
+            entry = (PRIORITY_RANK[priority], start_tag, next(self.seq))
+            heapq.heappush(self.queue, entry)
+            try:
+                self._wait_turn(entry, tokens)
+            except BaseException:
+                # Interrupted while queued (e.g. gevent timeout): leave no stale head behind
+                self.queue.remove(entry)
+                heapq.heapify(self.queue)
+                self.cond.notify_all()
+                raise
+            heapq.heappop(self.queue)
+            self.in_flight += 1
+            self.virtual_time = max(self.virtual_time, start_tag)
+            if len(self.last_finish) > 10000:
+                self.last_finish = {u: f for u, f in self.last_finish.items() if f > self.virtual_time}
+            self.cond.notify_all()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.in_flight -= 1
+                self.avg_service = 0.8 * self.avg_service + 0.2 * (time.monotonic() - started)
+                self.counters[f"calls_{priority}"] += 1
+                self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            stats = {
+                "slots": self.slots,
+                "in_flight": self.in_flight,
+                "queueing": self.queueing,
+                "avg_call_seconds": round(self.avg_service, 2),
+                "counters": dict(self.counters),
+            }
+            if self.queueing:
+                depth = Counter(entry[0] for entry in self.queue)
+                stats["queued"] = {name: depth.get(rank, 0) for name, rank in PRIORITY_RANK.items()}
+            return stats
@@ -0,0 +1,97 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+
+# Documents with at least this many pages are extracted in parallel
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+# Extraction processes per server process. Each gunicorn worker owns its own
+# pool, so the host-wide total is WEB_CONCURRENCY x PDF_EXTRACT_POOL_SIZE; the
+# default splits the host's CPUs across the workers.
+_WORKERS_PER_HOST = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+PDF_EXTRACT_POOL_SIZE = int(os.getenv(
+    "PDF_EXTRACT_POOL_SIZE", str(max(1, min(4, (os.cpu_count() or 1) // _WORKERS_PER_HOST)))
+))
+# Deadline for a whole parallel extraction
+PDF_EXTRACT_TIMEOUT = float(os.getenv("PDF_EXTRACT_TIMEOUT", "120"))
+# Shards per worker; more shards balance uneven pages (e.g. scanned vs text) better
+SHARDS_PER_WORKER = 4
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _extract_page_range(pdf_path, start, stop):
+    """Worker: open the document independently and extract pages [start, stop)."""
+    import fitz  # PyMuPDF
+    parts = []
+    with fitz.open(pdf_path) as doc:
+        for page_no in range(start, stop):
+            parts.append(doc[page_no].get_text("text") + "\n")
+    return "".join(parts)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # forkserver avoids forking a multithreaded server process; only this module is preloaded
+            ctx = multiprocessing.get_context("forkserver")
+            ctx.set_forkserver_preload(["pdf_extract"])
+            _pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_POOL_SIZE, mp_context=ctx)
+        return _pool
+
+
+def _reset_pool(pool):
+    """Discard a broken or stuck pool so the next large PDF gets a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    # Stuck children would keep running after shutdown(); stop them explicitly
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+
+def page_ranges(page_count, shards):
+    """Split [0, page_count) into at most `shards` contiguous ranges."""
+    shards = max(1, min(shards, page_count))
+    step, extra = divmod(page_count, shards)
+    ranges, start = [], 0
+    for i in range(shards):
+        stop = start + step + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def extract_text(pdf_path):
+    """Extract text from a PDF, sharding page ranges across a process pool for large documents."""
+    import fitz  # PyMuPDF, imported on first use to keep startup fast
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+        if page_count < PARALLEL_MIN_PAGES or PDF_EXTRACT_POOL_SIZE < 2:
+            return "".join(page.get_text("text") + "\n" for page in doc)
+
+    ranges = page_ranges(page_count, PDF_EXTRACT_POOL_SIZE * SHARDS_PER_WORKER)
+    pool = _get_pool()
+    deadline = time.monotonic() + PDF_EXTRACT_TIMEOUT
+    try:
+        futures = [pool.submit(_extract_page_range, pdf_path, start, stop) for start, stop in ranges]
+        # Results are joined in submission order, preserving page order
+        text = "".join(future.result(timeout=max(0, deadline - time.monotonic())) for future in futures)
+    except FuturesTimeoutError:
+        _reset_pool(pool)
+        raise TimeoutError(f"PDF extraction exceeded {PDF_EXTRACT_TIMEOUT:.0f}s")
+    except Exception as e:
+        # A dead child surfaces as BrokenProcessPool, or as OSError while respawning
+        logging.warning(f"Parallel PDF extraction failed, falling back to serial: {str(e)}")
+        _reset_pool(pool)
+        text = _extract_page_range(pdf_path, 0, page_count)
+    logging.info(f"Extracted {page_count} pages in {len(ranges)} shards across up to {PDF_EXTRACT_POOL_SIZE} processes")
+    return text
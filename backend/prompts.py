@@ -0,0 +1,94 @@
+import os
+import re
+import json
+import hashlib
+
+# Hard cap on estimated input tokens per LLM call (system + user prompt)
+LLM_MAX_INPUT_TOKENS = int(os.getenv("LLM_MAX_INPUT_TOKENS", "2500"))
+# Excluded questions are deduplicated, capped and truncated before being sent
+MAX_EXCLUDED_QUESTIONS = 10
+MAX_EXCLUDED_CHARS = 120
+# Rough characters-per-token ratio for English text with Llama tokenizers
+CHARS_PER_TOKEN = 4
+
+# Shared across every call so the instructions and schema are sent once, compactly
+SYSTEM_PROMPT = (
+    "You write exam multiple-choice questions from the given text. "
+    "Reply with a JSON array only. Each item: "
+    '{"question":str,"options":[4 str],"correct_answer":str (one of options),'
+    '"type":"theory"|"numerical","relevance_score":float 0-1}. '
+    "type is numerical for calculation/maths questions, else theory. "
+    "relevance_score is how central the question is to the subject."
+)
+
+DIFFICULTY_HINTS = {
+    "easy": "easy: direct recall of key terms; clearly wrong distractors.",
+    "medium": "medium: apply or analyse a concept; distractors reflect common mistakes.",
+    "hard": "hard: combine concepts or multi-step reasoning; very plausible distractors.",
+}
+
+QUESTION_TYPE_HINTS = {
+    "theory": " Prefer conceptual (theory) questions; avoid calculations.",
+    "numerical": " Prefer numerical (calculation) questions where the text allows.",
+}
+
+WORD_RE = re.compile(r"[a-zA-Z]{4,}")
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def compact_excluded(questions):
+    """Deduplicate by normalized hash, cap the count and truncate each question."""
+    seen, compacted = set(), []
+    for question in questions or []:
+        normalized = " ".join(str(question).lower().split())
+        digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        compacted.append(normalized[:MAX_EXCLUDED_CHARS])
+    return compacted[-MAX_EXCLUDED_QUESTIONS:]
+
+
+def build_mcq_messages(text, num_questions, difficulty, excluded_questions=None, max_input_tokens=LLM_MAX_INPUT_TOKENS, question_type="mixed"):
+    """Build chat messages for MCQ generation, truncating the source text to the input budget."""
+    header = f"Write {num_questions} {difficulty} questions. {DIFFICULTY_HINTS.get(difficulty, '')}"
+    header += QUESTION_TYPE_HINTS.get(question_type, "")
+    excluded = compact_excluded(excluded_questions)
+    if excluded:
+        header += f"\nAvoid questions similar to: {json.dumps(excluded, ensure_ascii=False)}"
+    header += "\nText:\n"
+    budget = max_input_tokens - estimate_tokens(SYSTEM_PROMPT) - estimate_tokens(header)
+    text = text[:max(0, budget) * CHARS_PER_TOKEN]
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": header + text},
+    ]
+
+
+def best_matching_chunk(chunks, question):
+    """Chunk sharing the most vocabulary with `question`, used to regenerate on the same topic."""
+    terms = set(w.lower() for w in WORD_RE.findall(question))
+    if not chunks:
+        return ""
+    return max(chunks, key=lambda chunk: sum(1 for w in WORD_RE.findall(chunk) if w.lower() in terms))
+
+
+def new_ledger():
+    return {"prompt_tokens": 0, "completion_tokens": 0, "calls": 0}
+
+
+def add_usage(ledger, usage):
+    """Add a completion's `usage` to a ledger dict."""
+    if ledger is None or usage is None:
+        return
+    ledger["prompt_tokens"] += usage.prompt_tokens or 0
+    ledger["completion_tokens"] += usage.completion_tokens or 0
+    ledger["calls"] += 1
+
+
+def ledger_increment(ledger, prefix="token_usage"):
+    """Mongo $inc document that adds a ledger to `<prefix>.*` fields."""
+    return {f"{prefix}.{key}": value for key, value in ledger.items()}
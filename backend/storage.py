@@ -0,0 +1,221 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import tempfile
+from datetime import datetime, timedelta
+
+from flask import Request
+from pytz import timezone
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Upload storage settings (overridable through the environment)
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "2000"))
+UPLOAD_REF_TTL_HOURS = int(os.getenv("UPLOAD_REF_TTL_HOURS", "24"))
+GC_GRACE_MINUTES = int(os.getenv("GC_GRACE_MINUTES", "60"))
+
+IST = timezone('Asia/Kolkata')
+BLOB_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadRejected(Exception):
+    """Raised when an upload is not a usable PDF (bad signature, too many pages)."""
+
+
+class HashingUpload:
+    """File-like sink for Werkzeug's multipart parser.
+
+    Bytes are written straight to a temp file inside the store while the SHA-256
+    is computed, so uploads are never held in memory and never hashed twice.
+    """
+
+    def __init__(self, tmp_dir, max_bytes=MAX_UPLOAD_BYTES):
+        self.file = tempfile.NamedTemporaryFile(dir=tmp_dir, suffix='.part', delete=False)
+        self.path = self.file.name
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.max_bytes = max_bytes
+        self.header = b""
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise RequestEntityTooLarge(f"PDF exceeds {MAX_UPLOAD_MB} MB limit")
+        if len(self.header) < 5:
+            self.header += data[:5 - len(self.header)]
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+class StreamingRequest(Request):
+    """Request class that streams uploaded files into the blob store's temp area."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return blob_store.new_upload()
+
+
+class BlobStore:
+    """Content-addressed PDF storage with reference counting.
+
+    Blobs live at `<root>/blobs/<sha[:2]>/<sha>.pdf`. Each blob document in Mongo
+    holds a `refs` map of holder -> timestamp; holders are `upload:<user_id>` for a
+    pending upload and `test:<test_id>` for a test generated from the PDF. Blobs
+    with no holders are removed by `collect_garbage`.
+    """
+
+    def __init__(self, root=UPLOAD_DIR, collection=None):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        self.blob_dir = os.path.join(root, 'blobs')
+        self.collection = collection
+
+    def new_upload(self):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return HashingUpload(self.tmp_dir)
+
+    def path_for(self, blob_id):
+        return os.path.join(self.blob_dir, blob_id[:2], f"{blob_id}.pdf")
+
+    def resolve(self, blob_id):
+        """Return the filesystem path of a stored blob, or None if unknown."""
+        if not blob_id or not BLOB_ID_RE.match(blob_id):
+            return None
+        path = self.path_for(blob_id)
+        return path if os.path.exists(path) else None
+
+    def commit(self, upload, holder):
+        """Validate a finished `HashingUpload` and store it under its content hash."""
+        upload.file.close()
+        try:
+            if upload.header != b"%PDF-":
+                raise UploadRejected("File is not a valid PDF")
+            import fitz  # PyMuPDF, imported on first upload to keep startup fast
+            try:
+                with fitz.open(upload.path) as doc:
+                    pages = doc.page_count
+            except Exception:
+                raise UploadRejected("File is not a valid PDF")
+            if pages > MAX_PDF_PAGES:
+                raise UploadRejected(f"PDF exceeds {MAX_PDF_PAGES} page limit")
+
+            blob_id = upload.sha256.hexdigest()
+            now = datetime.now(IST).isoformat()
+            # Record the reference before placing the file so a concurrent GC sweep sees it
+            result = self.collection.update_one(
+                {"_id": blob_id},
+                {
+                    "$set": {f"refs.{holder}": now, "last_used": now},
+                    "$setOnInsert": {"size": upload.size, "pages": pages, "created_at": now}
+                },
+                upsert=True
+            )
+            target = self.path_for(blob_id)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(upload.path, target)
+            logging.info(f"Stored PDF blob {blob_id[:12]} ({upload.size} bytes, {pages} pages, {'new' if result.upserted_id else 'deduplicated'})")
+            return blob_id, pages
+        finally:
+            if os.path.exists(upload.path):
+                os.remove(upload.path)
+
+    def add_ref(self, blob_id, holder):
+        now = datetime.now(IST).isoformat()
+        self.collection.update_one({"_id": blob_id}, {"$set": {f"refs.{holder}": now, "last_used": now}})
+
+    def release(self, blob_id, holder):
+        if not blob_id:
+            return
+        self.collection.update_one(
+            {"_id": blob_id},
+            {"$unset": {f"refs.{holder}": ""}, "$set": {"last_used": datetime.now(IST).isoformat()}}
+        )
+
+    def _delete_blob(self, blob_id):
+        path = self.path_for(blob_id)
+        trash = f"{path}.{os.getpid()}.deleting"
+        try:
+            os.replace(path, trash)
+        except FileNotFoundError:
+            return
+        # A racing upload may have re-created the blob document and file meanwhile
+        if self.collection.find_one({"_id": blob_id}, {"_id": 1}) and not os.path.exists(path):
+            os.replace(trash, path)
+        else:
+            os.remove(trash)
+
+    def _swept_files(self):
+        """Paths GC may delete: `tmp/*.part`, `blobs/<sha>.pdf` and `blobs/*.deleting`."""
+        if os.path.isdir(self.tmp_dir):
+            for name in os.listdir(self.tmp_dir):
+                if name.endswith('.part'):
+                    yield os.path.join(self.tmp_dir, name)
+        for dirpath, _, filenames in os.walk(self.blob_dir):
+            for name in filenames:
+                if name.endswith('.deleting') or (name.endswith('.pdf') and BLOB_ID_RE.match(name[:-4])):
+                    yield os.path.join(dirpath, name)
+
+    def collect_garbage(self):
+        """Expire stale upload refs, then delete unreferenced blobs and abandoned temp files."""
+        now = datetime.now(IST)
+        ref_cutoff = (now - timedelta(hours=UPLOAD_REF_TTL_HOURS)).isoformat()
+        grace_cutoff = (now - timedelta(minutes=GC_GRACE_MINUTES)).isoformat()
+        removed = 0
+
+        for blob in self.collection.find({}, {"refs": 1, "last_used": 1}):
+            refs = blob.get("refs", {})
+            stale = [h for h, ts in refs.items() if h.startswith("upload:") and ts < ref_cutoff]
+            if stale:
+                self.collection.update_one({"_id": blob["_id"]}, {"$unset": {f"refs.{h}": "" for h in stale}})
+            if len(refs) > len(stale) or blob.get("last_used", "") >= grace_cutoff:
+                continue
+            # Conditional delete: a ref added since the scan keeps the blob alive
+            deleted = self.collection.delete_one({
+                "_id": blob["_id"],
+                "last_used": {"$lt": grace_cutoff},
+                "$or": [{"refs": {}}, {"refs": {"$exists": False}}]
+            })
+            if deleted.deleted_count:
+                self._delete_blob(blob["_id"])
+                removed += 1
+
+        # Only the store's own files are swept: partial uploads left by aborted
+        # requests, blobs with no document, and leftovers of interrupted deletes.
+        # UPLOAD_DIR may be a shared mount, so nothing else under root is touched.
+        file_cutoff = time.time() - GC_GRACE_MINUTES * 60
+        for path in self._swept_files():
+            try:
+                if os.path.getmtime(path) >= file_cutoff:
+                    continue
+                name = os.path.basename(path)
+                blob_id = name[:-4] if name.endswith('.pdf') else None
+                if blob_id and self.collection.find_one({"_id": blob_id}, {"_id": 1}):
+                    continue
+                os.remove(path)
+                removed += 1
+            except OSError:
+                continue
+        if removed:
+            logging.info(f"Blob GC removed {removed} orphaned files")
+        return removed
+
+
+blob_store = None
+
+
+def init_blob_store(collection, root=UPLOAD_DIR):
+    global blob_store
+    blob_store = BlobStore(root, collection)
+    return blob_store
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Tests import backend modules directly, as app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.py loads .env but never overrides variables that are already set
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-for-the-backend-suite")
+os.environ.setdefault("MONGO_DB_URI", "mongodb://127.0.0.1:1")
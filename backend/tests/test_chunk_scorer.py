@@ -0,0 +1,55 @@
+import pytest
+
+import chunk_scorer
+from chunk_scorer import ChunkSampler, boilerplate_score, score_chunks
+
+
+def test_body_text_vocabulary_is_not_boilerplate():
+    text = (
+        "A B-tree index speeds up lookups. Each index entry references a page, "
+        "and the table's contents are stored in leaf nodes."
+    )
+    assert boilerplate_score(text) == 0.0
+
+
+def test_single_weak_marker_is_ignored():
+    assert boilerplate_score("This figure is copyright of the author.") == 0.0
+
+
+def test_front_matter_is_penalised():
+    copyright_page = "Copyright 2020 Example Press. All rights reserved.\nISBN 978-1-23456-789-0\nPrinted in India"
+    contents = "Contents\nChapter 1 Intro . . . . . . 1\nChapter 2 Sets ........ 14\nChapter 3 Maps ......... 30\n"
+    assert boilerplate_score(copyright_page) == 1.0
+    assert boilerplate_score(contents) > 0.5
+
+
+def test_score_chunks_ranks_body_above_front_matter():
+    body = "Photosynthesis converts light energy into chemical energy in chloroplasts, producing glucose. " * 8
+    front = "Copyright 2020. All rights reserved. ISBN 978-1. Printed in India.\nContents\nPreface\n" + body[:200]
+    scores = score_chunks([front, body])
+    assert scores[1] == 1.0
+    assert scores[0] < 0.5
+
+
+def test_question_type_biases_numeric_chunks():
+    theory = "Photosynthesis converts light energy into chemical energy in chloroplasts, producing glucose. " * 8
+    numeric = "Compute the velocity: v = 12 * 3 + 4 = 40 m/s, then a = 40 / 8 = 5 m/s2 and distance 5 * 64 / 2 = 160 m. " * 8
+    assert score_chunks([theory, numeric], "numerical")[1] == 1.0
+    assert score_chunks([theory, numeric], "theory")[0] == 1.0
+    assert score_chunks([theory, numeric], "theory")[1] < score_chunks([theory, numeric], "mixed")[1]
+
+
+def test_sampler_caches_scores_per_document(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    stats = mongomock.MongoClient().db.chunk_stats
+    chunks = ["Photosynthesis converts light energy into chemical energy. " * 5, "Cells divide by mitosis. " * 5]
+    first = ChunkSampler(chunks, "doc", stats, "theory")
+    first.record(0, 2, 1)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("scores should come from the cache")
+
+    monkeypatch.setattr(chunk_scorer, "score_chunks", fail)
+    second = ChunkSampler(chunks, "doc", stats, "theory")
+    assert second.scores == first.scores
+    assert second.history == {0: {"attempts": 2, "accepted": 1}}
@@ -0,0 +1,114 @@
+import json
+import queue
+
+from bson import ObjectId
+from flask_jwt_extended import create_access_token
+
+from app import app
+from live_feed import LiveFeedHub
+
+
+def make_token(**claims):
+    with app.app_context():
+        return create_access_token(identity=str(ObjectId()), additional_claims=claims)
+
+
+def test_live_feed_is_refused_on_sync_workers():
+    token = make_token(scope="live_feed", test_name="quiz")
+    response = app.test_client().get(f"/api/live-feed?test_name=quiz&jwt={token}")
+    assert response.status_code == 501
+    assert "student-results" in response.get_json()["error"]
+
+
+def test_live_feed_requires_a_token():
+    response = app.test_client().get("/api/live-feed?test_name=quiz")
+    assert response.status_code == 401
+
+
+def test_live_feed_rejects_unscoped_tokens_in_the_url():
+    response = app.test_client().get(f"/api/live-feed?test_name=quiz&jwt={make_token()}")
+    assert response.status_code == 403
+
+
+def test_live_feed_token_is_bound_to_its_test():
+    token = make_token(scope="live_feed", test_name="other")
+    response = app.test_client().get(f"/api/live-feed?test_name=quiz&jwt={token}")
+    assert response.status_code == 403
+
+
+def test_scoped_token_cannot_call_other_routes():
+    token = make_token(scope="live_feed", test_name="quiz")
+    response = app.test_client().get("/api/llm-usage", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
+
+
+class FakeStream:
+    def __init__(self, changes):
+        self.changes = changes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def try_next(self):
+        try:
+            return self.changes.get(timeout=0.05)
+        except queue.Empty:
+            return None
+
+
+class FakeTests:
+    """A single test document whose change stream is fed by `submit`."""
+
+    def __init__(self, test_id):
+        self.doc = {"_id": test_id, "status": "active", "result": {}}
+        self.changes = queue.Queue()
+        self.calls = []
+
+    def submit(self, student_id, result):
+        self.doc["result"][student_id] = result
+        self.changes.put({
+            "operationType": "update",
+            "updateDescription": {"updatedFields": {f"result.{student_id}": result}},
+        })
+
+    def watch(self, pipeline, max_await_time_ms=None):
+        self.calls.append("watch")
+        # A student submits right after the stream opens, before the snapshot read
+        self.submit("early", {"score": 1})
+        return FakeStream(self.changes)
+
+    def find_one(self, query, projection=None):
+        self.calls.append("find_one")
+        return {**self.doc, "result": dict(self.doc["result"])}
+
+
+def test_snapshot_is_read_after_the_stream_opens():
+    test_id = ObjectId()
+    tests = FakeTests(test_id)
+    events = LiveFeedHub(tests).stream(test_id, json.dumps)
+    try:
+        snapshot = next(events)
+        assert tests.calls[:2] == ["watch", "find_one"]
+        assert '"submitted": ["early"]' in snapshot
+
+        tests.submit("late", {"score": 2})
+        frame = next(events)
+        assert frame.startswith("event: submission") and '"late"' in frame
+    finally:
+        events.close()
+
+
+def test_overwritten_result_is_streamed():
+    test_id = ObjectId()
+    tests = FakeTests(test_id)
+    events = LiveFeedHub(tests).stream(test_id, json.dumps)
+    try:
+        next(events)
+        tests.submit("early", {"score": 3})
+        frame = next(events)
+        assert frame.startswith("event: resubmission") and '"score": 3' in frame
+    finally:
+        events.close()
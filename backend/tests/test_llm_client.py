@@ -0,0 +1,29 @@
+import httpx
+import pytest
+
+from llm_client import LLMClient, TokenBucket
+
+
+def test_bucket_charges_are_capped_at_capacity():
+    bucket = TokenBucket(600, capacity=100)
+    assert bucket.try_acquire(250) == 0.0
+    assert bucket.try_acquire(1) > 0
+
+
+def test_token_budget_follows_provider_headers():
+    client = LLMClient("test-key", tokens_per_minute=6000)
+    client._sync_from_headers(httpx.Headers({
+        "x-ratelimit-remaining-requests": "900",
+        "x-ratelimit-remaining-tokens": "1200",
+        "x-ratelimit-reset-tokens": "7.5s",
+    }))
+    assert client.try_reserve(1000) == 0.0
+    # Only ~200 tokens remain, and the request token is handed back
+    requests_left = client.bucket.tokens
+    assert client.try_reserve(1000) > 0
+    assert client.bucket.tokens == pytest.approx(requests_left, abs=0.01)
+
+
+def test_call_cost_counts_prompt_and_completion_budget():
+    messages = [{"role": "system", "content": "x" * 400}, {"role": "user", "content": "y" * 800}]
+    assert LLMClient.call_cost(messages, 1024) == 300 + 1024
@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+from llm_client import LLMClient
+from llm_scheduler import FairScheduler, BULK, INTERACTIVE
+
+
+def FakeClient(limit, rate_per_minute=6000):
+    return LLMClient("test-key", requests_per_minute=rate_per_minute, max_concurrency=limit * 2)
+
+
+def test_slots_follow_client_limiter():
+    scheduler = FairScheduler()
+    client = FakeClient(limit=3)
+    with scheduler.slot("u1", "teacher", client=client):
+        assert scheduler.slots == 3
+        client.limiter.limit = 1.0
+        assert scheduler.stats()["slots"] == 1
+
+
+def test_interactive_call_takes_next_token_before_queued_bulk():
+    scheduler = FairScheduler()
+    client = FakeClient(limit=4, rate_per_minute=60)
+    client.bucket.tokens = 0.0
+    served = []
+
+    def call(user_id, priority):
+        with scheduler.slot(user_id, "teacher", priority, client=client):
+            served.append(priority)
+
+    bulk = threading.Thread(target=call, args=("u1", BULK))
+    bulk.start()
+    time.sleep(0.1)
+    interactive = threading.Thread(target=call, args=("u2", INTERACTIVE))
+    interactive.start()
+    bulk.join(5)
+    interactive.join(5)
+    assert served == [INTERACTIVE, BULK]
+
+
+def test_interrupted_wait_leaves_queue_clean():
+    scheduler = FairScheduler(default_slots=1)
+    original_wait = scheduler.cond.wait
+
+    def interrupted(timeout=None):
+        raise KeyboardInterrupt
+
+    with scheduler.slot("u1", "teacher"):
+        scheduler.cond.wait = interrupted
+        with pytest.raises(KeyboardInterrupt):
+            with scheduler.slot("u2", "teacher"):
+                pass
+        scheduler.cond.wait = original_wait
+        assert scheduler.queue == []
+    with scheduler.slot("u3", "teacher"):
+        assert scheduler.in_flight == 1
+
+
+def test_non_queueing_process_reports_no_position():
+    scheduler = FairScheduler(queueing=False)
+    assert scheduler.admit("u1", "unknown-role", BULK) is None
+    assert "queued" not in scheduler.stats()
@@ -0,0 +1,51 @@
+import os
+import signal
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+import pdf_extract
+
+
+@pytest.fixture
+def large_pdf(tmp_path):
+    path = tmp_path / "book.pdf"
+    doc = fitz.open()
+    for page_no in range(40):
+        doc.new_page().insert_text((72, 72), f"page {page_no}")
+    doc.save(path)
+    doc.close()
+    return str(path)
+
+
+@pytest.fixture
+def parallel(monkeypatch):
+    monkeypatch.setattr(pdf_extract, "PARALLEL_MIN_PAGES", 10)
+    monkeypatch.setattr(pdf_extract, "PDF_EXTRACT_POOL_SIZE", 2)
+    yield
+    if pdf_extract._pool is not None:
+        pdf_extract._reset_pool(pdf_extract._pool)
+
+
+def test_page_ranges_cover_every_page_in_order():
+    assert pdf_extract.page_ranges(10, 4) == [(0, 3), (3, 6), (6, 8), (8, 10)]
+    assert pdf_extract.page_ranges(3, 16) == [(0, 1), (1, 2), (2, 3)]
+
+
+def test_parallel_extraction_matches_serial(large_pdf, parallel):
+    serial = pdf_extract._extract_page_range(large_pdf, 0, 40)
+    assert pdf_extract.extract_text(large_pdf) == serial
+    assert [line for line in serial.split("\n") if line][:3] == ["page 0", "page 1", "page 2"]
+
+
+def test_broken_pool_is_replaced(large_pdf, parallel):
+    expected = pdf_extract._extract_page_range(large_pdf, 0, 40)
+    pool = pdf_extract._get_pool()
+    pool.submit(os.getpid).result()
+    os.kill(next(iter(pool._processes)), signal.SIGKILL)
+
+    assert pdf_extract.extract_text(large_pdf) == expected
+    assert pdf_extract._pool is None
+    assert pdf_extract.extract_text(large_pdf) == expected
+    assert pdf_extract._pool is not pool
@@ -0,0 +1,108 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+import storage
+from storage import BlobStore, IST
+
+
+def iso(**delta):
+    return (datetime.now(IST) - timedelta(**delta)).isoformat()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path), mongomock.MongoClient().db.blobs)
+
+
+def put_blob(store, blob_id, refs, last_used, file_age=2 * 3600):
+    store.collection.insert_one({"_id": blob_id, "refs": refs, "last_used": last_used})
+    path = store.path_for(blob_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4")
+    old = time.time() - file_age
+    os.utime(path, (old, old))
+    return path
+
+
+def test_referenced_blob_is_kept(store):
+    path = put_blob(store, "a" * 64, {"test:1": iso(days=30)}, iso(days=30))
+    assert store.collect_garbage() == 0
+    assert os.path.exists(path)
+
+
+def test_unreferenced_blob_is_removed_after_grace(store):
+    path = put_blob(store, "b" * 64, {}, iso(hours=2))
+    assert store.collect_garbage() == 1
+    assert not os.path.exists(path)
+    assert store.collection.find_one({"_id": "b" * 64}) is None
+
+
+def test_unreferenced_blob_within_grace_is_kept(store):
+    path = put_blob(store, "c" * 64, {}, iso(minutes=5))
+    assert store.collect_garbage() == 0
+    assert os.path.exists(path)
+
+
+def test_stale_upload_refs_expire(store):
+    old = iso(hours=storage.UPLOAD_REF_TTL_HOURS + 1)
+    path = put_blob(store, "d" * 64, {"upload:u1": old}, old)
+    assert store.collect_garbage() == 1
+    assert not os.path.exists(path)
+
+
+def test_stale_upload_ref_is_dropped_but_test_ref_keeps_blob(store):
+    old = iso(hours=storage.UPLOAD_REF_TTL_HOURS + 1)
+    path = put_blob(store, "e" * 64, {"upload:u1": old, "test:t1": old}, old)
+    assert store.collect_garbage() == 0
+    assert os.path.exists(path)
+    assert store.collection.find_one({"_id": "e" * 64})["refs"] == {"test:t1": old}
+
+
+def test_fresh_upload_ref_keeps_blob(store):
+    path = put_blob(store, "f" * 64, {"upload:u1": iso(hours=1)}, iso(hours=2))
+    assert store.collect_garbage() == 0
+    assert os.path.exists(path)
+
+
+def test_orphaned_files_are_swept_after_grace(store):
+    orphan = put_blob(store, "9" * 64, {"test:1": iso(hours=2)}, iso(hours=2))
+    store.collection.delete_one({"_id": "9" * 64})
+    os.makedirs(store.tmp_dir, exist_ok=True)
+    stale_part = os.path.join(store.tmp_dir, "old.part")
+    fresh_part = os.path.join(store.tmp_dir, "new.part")
+    for path in (stale_part, fresh_part):
+        open(path, "wb").close()
+    old = time.time() - 2 * 3600
+    os.utime(stale_part, (old, old))
+
+    assert store.collect_garbage() == 2
+    assert not os.path.exists(orphan)
+    assert not os.path.exists(stale_part)
+    assert os.path.exists(fresh_part)
+
+
+def test_files_outside_the_store_layout_survive(store):
+    foreign = [
+        os.path.join(store.root, "src", "config.yaml"),
+        os.path.join(store.tmp_dir, "notes.txt"),
+        os.path.join(store.blob_dir, "ab", "report.pdf"),
+    ]
+    for path in foreign:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+        old = time.time() - 2 * 3600
+        os.utime(path, (old, old))
+    leftover = os.path.join(store.blob_dir, "aa", f"{'a' * 64}.pdf.123.deleting")
+    os.makedirs(os.path.dirname(leftover), exist_ok=True)
+    open(leftover, "wb").close()
+    os.utime(leftover, (old, old))
+
+    assert store.collect_garbage() == 1
+    assert all(os.path.exists(path) for path in foreign)
+    assert not os.path.exists(leftover)
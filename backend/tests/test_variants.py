@@ -0,0 +1,76 @@
+import random
+
+from bson import ObjectId
+
+from variants import shuffled_mcqs, canonical_answers, student_answers, score_answers, variant
+
+
+def make_test(num_questions=8):
+    return {
+        "_id": ObjectId("65f000000000000000000001"),
+        "mcqs": [
+            {
+                "question": f"Question {i}",
+                "options": [f"q{i} option {j}" for j in range(4)],
+                "correct_answer": f"q{i} option {i % 4}",
+            }
+            for i in range(num_questions)
+        ],
+    }
+
+
+def frontend_score(mcqs, answers):
+    """Score the way TakeTest.tsx does: against the questions as the student saw them."""
+    return sum(1 for index, answer in answers.items() if answer == mcqs[int(index)]["correct_answer"])
+
+
+def test_variant_is_pinned_for_a_seed():
+    # Changing the seed derivation would reshuffle every test already in progress
+    assert variant("65f000000000000000000001", "student-a", (4, 4, 4)) == (
+        (1, 0, 2), ((2, 3, 0, 1), (0, 2, 1, 3), (2, 0, 3, 1))
+    )
+
+
+def test_variants_are_deterministic_per_student():
+    test = make_test()
+    assert shuffled_mcqs(test, "student-a") == shuffled_mcqs(test, "student-a")
+    assert shuffled_mcqs(test, "student-a") != shuffled_mcqs(test, "student-b")
+
+
+def test_shuffled_view_keeps_every_question_and_option():
+    test = make_test()
+    shuffled = shuffled_mcqs(test, "student-a")
+    assert sorted(mcq["question"] for mcq in shuffled) == [mcq["question"] for mcq in test["mcqs"]]
+    for mcq in shuffled:
+        canonical = next(c for c in test["mcqs"] if c["question"] == mcq["question"])
+        assert sorted(mcq["options"]) == sorted(canonical["options"])
+        assert mcq["correct_answer"] in mcq["options"]
+
+
+def test_answers_round_trip_between_views():
+    test = make_test()
+    shuffled = shuffled_mcqs(test, "student-a")
+    answers = {str(position): mcq["options"][position % 4] for position, mcq in enumerate(shuffled)}
+    canonical = canonical_answers(test, "student-a", answers)
+    for index, answer in canonical.items():
+        assert answer in test["mcqs"][int(index)]["options"]
+    assert student_answers(test, "student-a", canonical) == answers
+
+
+def test_server_score_matches_frontend_score():
+    test = make_test()
+    rng = random.Random(7)
+    for student_id in ("student-a", "student-b", "student-c"):
+        shuffled = shuffled_mcqs(test, student_id)
+        answers = {
+            str(position): rng.choice(mcq["options"])
+            for position, mcq in enumerate(shuffled) if rng.random() < 0.8
+        }
+        canonical = canonical_answers(test, student_id, answers)
+        assert score_answers(test, canonical) == frontend_score(shuffled, answers)
+
+
+def test_out_of_range_answers_are_dropped():
+    test = make_test(3)
+    assert canonical_answers(test, "student-a", {"7": "x", "nope": "y", "-1": "z"}) == {}
+    assert canonical_answers(test, "student-a", None) == {}
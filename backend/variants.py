@@ -0,0 +1,82 @@
+import random
+import hashlib
+from functools import lru_cache
+
+
+def _rng(test_id, student_id):
+    """PRNG seeded from the test and student ids, identical on every fetch."""
+    seed = hashlib.sha256(f"{test_id}:{student_id}".encode('utf-8')).digest()
+    return random.Random(int.from_bytes(seed[:8], 'big'))
+
+
+@lru_cache(maxsize=4096)
+def variant(test_id, student_id, option_counts):
+    """Question order and per-question option order for one student.
+
+    `option_counts` is a tuple with the number of options of each canonical
+    question. Returns `(order, option_orders)` where `order[i]` is the canonical
+    index shown at position i and `option_orders[c]` permutes question c's options.
+    """
+    rng = _rng(test_id, student_id)
+    order = list(range(len(option_counts)))
+    rng.shuffle(order)
+    option_orders = []
+    for count in option_counts:
+        options = list(range(count))
+        rng.shuffle(options)
+        option_orders.append(tuple(options))
+    return tuple(order), tuple(option_orders)
+
+
+def _variant_for(test, student_id):
+    option_counts = tuple(len(mcq.get("options", [])) for mcq in test["mcqs"])
+    return variant(str(test["_id"]), student_id, option_counts)
+
+
+def shuffled_mcqs(test, student_id):
+    """The student's view of a test's MCQs, built from the single canonical copy."""
+    order, option_orders = _variant_for(test, student_id)
+    mcqs = test["mcqs"]
+    shuffled = []
+    for canonical_index in order:
+        mcq = mcqs[canonical_index]
+        options = mcq.get("options", [])
+        shuffled.append({**mcq, "options": [options[i] for i in option_orders[canonical_index]]})
+    return shuffled
+
+
+def canonical_answers(test, student_id, answers):
+    """Map answers keyed by the student's question positions back to canonical indexes.
+
+    Answers are option strings, so only the question index needs remapping.
+    """
+    order, _ = _variant_for(test, student_id)
+    mapped = {}
+    for position, answer in (answers or {}).items():
+        try:
+            position = int(position)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= position < len(order):
+            mapped[str(order[position])] = answer
+    return mapped
+
+
+def student_answers(test, student_id, answers):
+    """Inverse of `canonical_answers`: key canonical answers by the student's positions."""
+    order, _ = _variant_for(test, student_id)
+    position_of = {canonical: position for position, canonical in enumerate(order)}
+    return {
+        str(position_of[int(index)]): answer
+        for index, answer in (answers or {}).items()
+        if int(index) in position_of
+    }
+
+
+def score_answers(test, answers):
+    """Number of canonical answers matching the correct option."""
+    mcqs = test["mcqs"]
+    return sum(
+        1 for index, answer in answers.items()
+        if int(index) < len(mcqs) and answer == mcqs[int(index)].get("correct_answer")
+    )